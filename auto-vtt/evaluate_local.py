@@ -27,7 +27,9 @@ df = pd.read_csv(dataset_path)
 action_labels = list(df["action"].unique())
 num_labels = len(action_labels)
 
-audio_processor = AudioProcessor()
+noises = ["ac", "turnsignal", "convo"]
+
+audio_processor = AudioProcessor(noise_types=noises)
 speech_to_text_converter = SpeechToTextConverter(SpeechToTextConverter.ModelSize.TINY)
 action_classifier = ActionClassifier(labels=action_labels)
 
@@ -36,7 +38,7 @@ accuracy_metric = Accuracy(task="multiclass", num_classes=num_labels)
 f1_metric = F1Score(task="multiclass", num_classes=num_labels, average="macro")
 auroc_metric = AUROC(task="multiclass", num_classes=num_labels)
 
-noises = ["ac", "turnsignal", "convo"]
+transcripts = []  # (true action, predicted text)
 
 # using only first 10 rows of the dataset for now bc too slow
 for _, row in tqdm(df.head(10).iterrows(), total=10):
@@ -57,15 +59,17 @@ for _, row in tqdm(df.head(10).iterrows(), total=10):
         processed_audio.export(processed_audio_path, format="wav")
         # Step 2: Convert audio to text
         predicted_text = speech_to_text_converter.transcribe(processed_audio_path)
-
-        # Step 3: Run inference
         if predicted_text:
-            predicted_action, score = action_classifier(predicted_text)
-            print(predicted_action, "  ", score)
+            transcripts.append((true_action, predicted_text))
+
+# Step 3: Run inference on all transcripts at once
+predictions = action_classifier.classify_batch([text for _, text in transcripts])
+for (true_action, _), (predicted_action, score) in zip(transcripts, predictions):
+    print(predicted_action, "  ", score)
 
-            # Collect true and predicted labels for evaluation
-            y_true_action.append(true_action)
-            y_pred_action.append([predicted_action, score])
+    # Collect true and predicted labels for evaluation
+    y_true_action.append(true_action)
+    y_pred_action.append([predicted_action, score])
 
 # convert string labels to numerical values
 label_map = {}
@@ -8,7 +8,8 @@ from src.auto_vtt.audio_processing import AudioProcessor
 from src.auto_vtt.speech_to_text import SpeechToTextConverter
 from src.auto_vtt.inferencing.action_classifier import ActionClassifier
 
-audio_processor = AudioProcessor()
+noise_type = "turnsignal"
+audio_processor = AudioProcessor(noise_types=[noise_type])
 action_classifier = ActionClassifier(labels=action_labels)
 normalizer = EnglishTextNormalizer()
 
@@ -27,9 +28,8 @@ for _, row in tdqm(test_segment.iterrows(), total=len(test_segment)):
     tmp_dir.mkdir(parents=True, exist_ok=True)
 
     # process audio
-    noise_type = "turnsignal"
     processed_audios = audio_processor.process_file(full_audio_path)
-    p_audio = processed_audios["turnsignal"]
+    p_audio = processed_audios[noise_type]
     processed_audio_path = tmp_dir / f"processed_{audio_path}.wav"
     processed_audio.export(processed_audio_path, format="wav")
 
@@ -37,7 +37,7 @@ for _, row in tdqm(test_segment.iterrows(), total=len(test_segment)):
 
 wer_averages = {}  # {model size: score}
 for model_size in SpeechToTextConverter.ModelSize:
-    speech_to_text_converter = SpeechToTextConverter(model_size.value)
+    speech_to_text_converter = SpeechToTextConverter(model_size)
     # transcribe
     wer_list = []
     for path, true_text in processed:
@@ -1,41 +1,137 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Optional
+import zlib
+
 from pydub import AudioSegment
 import numpy as np
 from pathlib import Path
 
 from loguru import logger
 
+from . import dsp
+from .noise_bank import NoiseBank, default_noise_bank
+
+
+@dataclass(frozen=True)
+class NoiseCondition:
+    """
+    One noisy variant: a noise source mixed into the clip, followed by a
+    low-pass filter simulating the muffled car interior.
+
+    :param source: "white" for generated white noise, otherwise the name of a
+        car noise in the noise bank.
+    :param level: Noise level in dB. Car noises are set relative to the clip's
+        loudness (an SNR offset); white noise, normalized to a full scale peak,
+        is scaled by it directly.
+    :param cutoff: Cutoff of the low-pass filter applied to the mix, in Hz.
+    """
+
+    source: str
+    level: float
+    cutoff: int
+
+
+DEFAULT_CONDITIONS = {
+    "noise": NoiseCondition("white", -30, 8000),
+    "ac": NoiseCondition("ac", -20, 5000),
+    "convo": NoiseCondition("convo", -5, 5000),
+    "radio": NoiseCondition("radio", -5, 5000),
+    "turnsignal": NoiseCondition("turnsignal", -5, 5000),
+}
+
+
+@dataclass
+class AudioBatch:
+    samples: np.ndarray  # (clips, noise types, frames), mono float32, zero padded
+    lengths: np.ndarray  # (clips,) number of valid frames per clip
+    noise_types: list
+    sample_rate: int
+
+    def clips(self, noise_type: str) -> list:
+        """
+        Returns the unpadded 1-D clips of one noise type, e.g. for
+        `SpeechToTextConverter.transcribe_batch`.
+        """
+        idx = self.noise_types.index(noise_type)
+        return [self.samples[i, idx, :length] for i, length in enumerate(self.lengths)]
+
 
 class AudioProcessor:
-    def __init__(self):
-        noise_path = Path(__file__).parent / "car_sounds"
-        car_noise_paths = {
-            "ac": noise_path / "car_ac.flac",
-            "convo": noise_path / "car_conversation_music.wav",
-            "radio": noise_path / "car_radio.wav",
-            "turnsignal": noise_path / "car_turnsignal.mp3",
-        }
-        
-        self.car_noise_targets = {
-            "ac": -20,
-            "convo": -5,
-            "radio": -5,
-            "turnsignal": -5,
+    def __init__(
+        self,
+        seed: Optional[int] = None,
+        noise_bank: Optional[NoiseBank] = None,
+        noise_types: Optional[list] = None,
+        conditions: Optional[dict] = None,
+    ):
+        """
+        :param seed: Seed for the white noise. When set, the noise for a clip is
+            derived from the seed and the clip's samples, so processing the same
+            clip always gives the same result.
+        :param noise_bank: Source of the car noises. Defaults to a bank shared by
+            every processor in the process and persisted across processes.
+        :param noise_types: Names of the conditions to produce, defaults to all.
+        :param conditions: Variant name to `NoiseCondition`, defaults to
+            `DEFAULT_CONDITIONS`.
+        """
+        self.noise_bank = noise_bank or default_noise_bank()
+
+        conditions = dict(conditions or DEFAULT_CONDITIONS)
+        if noise_types is not None:
+            unknown = set(noise_types) - set(conditions)
+            if unknown:
+                raise ValueError(f"Unknown noise types: {sorted(unknown)}")
+            conditions = {name: conditions[name] for name in noise_types}
+        for condition in conditions.values():
+            if (
+                condition.source != "white"
+                and condition.source not in self.noise_bank.noise_paths
+            ):
+                raise ValueError(f"Unknown noise source: {condition.source}")
+        self.conditions = conditions
+
+        self.seed = seed
+
+    @property
+    def noise_types(self) -> list:
+        """
+        Names of the variants `process_audio` returns, in order.
+        """
+        return list(self.conditions)
+
+    @property
+    def config(self) -> dict:
+        """
+        Everything that affects the output of `process_audio`, e.g. for cache keys.
+        """
+        return {
+            "conditions": {
+                name: asdict(condition) for name, condition in self.conditions.items()
+            },
+            "car_noises": {
+                condition.source: Path(
+                    self.noise_bank.noise_paths[condition.source]
+                ).name
+                for condition in self.conditions.values()
+                if condition.source != "white"
+            },
+            "seed": self.seed,
+            "engine": "numpy",
         }
-        
-        self.car_noises = {}
-        
-        for noise, file in car_noise_paths.items():
-            self.car_noises[noise] = AudioSegment.from_file(file)
-    
-    def process_file(self, audio_file_path) -> AudioSegment:
-        """
-                Processes the input audio file to simulate the acoustic environment of a moving car.
-
-                Parameters:
-                - audio_file_path (str): Path to the input audio file.
-        x
-                Returns:
-                - AudioSegment: The transformed audio segment.
+
+    def process_file(
+        self, audio_file_path, noise_types: Optional[list] = None
+    ) -> dict:
+        """
+        Processes the input audio file to simulate the acoustic environment of a moving car.
+
+        Parameters:
+        - audio_file_path (str): Path to the input audio file.
+        - noise_types (list): Variants to produce, defaults to all of `noise_types`.
+
+        Returns:
+        - dict: The transformed audio segments by noise type.
         """
         # Load the original audio file
         try:
@@ -43,51 +139,140 @@ class AudioProcessor:
         except Exception as e:
             raise ValueError(f"Could not load audio file: {e}")
 
-        return self.process_audio(original_audio)
-
-    def process_audio(self, audio: AudioSegment) -> AudioSegment:
-        # Generate background noise to simulate car interior noise
-        duration_ms = len(audio)
-        sample_rate = audio.frame_rate  # Use the original audio's sample rate
-        num_samples = int(duration_ms * sample_rate / 1000.0)
-
-        # Generate white noise
-        samples = np.random.normal(0, 1, size=num_samples)
-        samples /= np.max(np.abs(samples))  # Normalize to -1 to 1
-
-        # Convert numpy array to 16-bit PCM audio segment
-        samples_int16 = (samples * 32767).astype(np.int16)
-        noise_audio = AudioSegment(
-            samples_int16.tobytes(),
-            frame_rate=sample_rate,
-            sample_width=2,  # 16 bits = 2 bytes
-            channels=1,
+        return self.process_audio(original_audio, noise_types)
+
+    def process_audio(
+        self, audio: AudioSegment, noise_types: Optional[list] = None
+    ) -> dict:
+        """
+        Processes an audio segment into its noisy variants.
+
+        The work is done on float32 arrays by `process_array`; the variants are
+        converted back to segments in the input's frame rate, channel count and
+        sample width.
+        """
+        samples = dsp.segment_to_array(audio)
+        variants = self.process_array(samples, audio.frame_rate, noise_types)
+        return {
+            name: dsp.array_to_segment(variant, audio.frame_rate, audio.sample_width)
+            for name, variant in variants.items()
+        }
+
+    def process_batch(
+        self,
+        audio_file_paths: list,
+        noise_types: Optional[list] = None,
+        snr_targets: Optional[dict] = None,
+        sample_rate: int = 16000,
+        num_workers: Optional[int] = None,
+    ) -> AudioBatch:
+        """
+        Loads and processes many files at once into one padded array.
+
+        Parameters:
+        - audio_file_paths (list): Paths of the input audio files.
+        - noise_types (list): Variants to produce, defaults to all of `noise_types`.
+        - snr_targets (dict): Overrides of the conditions' levels, by noise type.
+        - sample_rate (int): Rate the clips are resampled to; the output is mono.
+        - num_workers (int): Threads used to decode and process the files.
+
+        Returns:
+        - AudioBatch: Variants of every clip, in input order.
+        """
+        noise_types = list(noise_types or self.noise_types)
+
+        def load_and_process(audio_file_path):
+            try:
+                audio = AudioSegment.from_file(audio_file_path)
+            except Exception as e:
+                raise ValueError(f"Could not load audio file: {e}")
+            audio = audio.set_channels(1).set_frame_rate(sample_rate)
+            samples = dsp.segment_to_array(audio)
+            return self.process_array(samples, sample_rate, noise_types, snr_targets)
+
+        with ThreadPoolExecutor(num_workers) as pool:
+            processed = list(pool.map(load_and_process, audio_file_paths))
+
+        lengths = np.array(
+            [len(variants[noise_types[0]]) for variants in processed], dtype=np.int64
+        )
+        samples = np.zeros(
+            (len(processed), len(noise_types), lengths.max(initial=0)), dtype=np.float32
         )
+        for i, variants in enumerate(processed):
+            for j, noise_type in enumerate(noise_types):
+                samples[i, j, : lengths[i]] = variants[noise_type][:, 0]
 
-        # Adjust the volume of the noise and apply a low-pass filter to simulate engine noise
-        noise_audio = noise_audio - 30  # Reduce noise volume by 30 dB
-        # noise_audio = noise_audio.low_pass_filter(1000)  # Low-pass filter at 1 kHz
-
-        # Mix the original audio with the background noise
-        mixed_audio = audio.overlay(noise_audio)
-
-        # Apply a low-pass filter to the mixed audio to simulate the muffled environment
-        mixed_audio = mixed_audio.low_pass_filter(8000)  # Low-pass filter at 8 kHz
-
-        mixed_with_car_sounds = {"noise": mixed_audio}
-
-        for noise, noise_audio in self.car_noises.items():
-            # normalize noise audio so that it is about 20 dB lower than the original audio
-            original_loudness = audio.dBFS
-            noise_loudness = noise_audio.dBFS
-            
-            target_loudness = original_loudness + self.car_noise_targets[noise]
-            loudness_adjustment = target_loudness - noise_loudness
-            normalized_noise_audio = noise_audio.apply_gain(loudness_adjustment)
-            
-            new_segment = audio.overlay(normalized_noise_audio).low_pass_filter(
-                5000
+        return AudioBatch(samples, lengths, noise_types, sample_rate)
+
+    def iter_batches(self, audio_file_paths: list, batch_size: int, **kwargs):
+        """
+        Yields `process_batch` results for consecutive slices of `batch_size` files.
+        """
+        for start in range(0, len(audio_file_paths), batch_size):
+            yield self.process_batch(
+                audio_file_paths[start : start + batch_size], **kwargs
+            )
+
+    def process_array(
+        self,
+        samples: np.ndarray,
+        frame_rate: int,
+        noise_types: Optional[list] = None,
+        snr_targets: Optional[dict] = None,
+    ) -> dict:
+        """
+        Processes float32 samples of shape (frames, channels) into their noisy
+        variants, each an array of the same shape. Only the variants listed in
+        `noise_types` are computed, and `snr_targets` overrides the levels of
+        their conditions.
+        """
+        noise_types = noise_types or self.noise_types
+        unknown = set(noise_types) - set(self.conditions)
+        if unknown:
+            raise ValueError(f"Unknown noise types: {sorted(unknown)}")
+        snr_targets = snr_targets or {}
+        num_frames, channels = samples.shape
+        original_loudness = dsp.dbfs(samples)
+
+        mixed_with_car_sounds = {}
+        for name in self.noise_types:
+            if name not in noise_types:
+                continue
+            condition = self.conditions[name]
+            level = snr_targets.get(name, condition.level)
+
+            if condition.source == "white":
+                # Generate white noise to simulate car interior noise
+                noise = self.white_noise(samples) * dsp.db_to_gain(level)
+            else:
+                noise, noise_loudness = self.noise_bank.get(
+                    condition.source, frame_rate, channels
+                )
+
+                # normalize noise audio so that it sits at the target level
+                # relative to the original audio
+                target_loudness = original_loudness + level
+                gain = dsp.db_to_gain(target_loudness - noise_loudness)
+                # only the overlap is mixed in, so only it is read and scaled
+                noise = np.clip(noise[:num_frames] * gain, -1.0, 1.0)
+
+            # Mix the original audio with the background noise and apply a
+            # low-pass filter to simulate the muffled environment
+            mixed_with_car_sounds[name] = dsp.low_pass(
+                dsp.mix(samples, noise), condition.cutoff, frame_rate
             )
-            mixed_with_car_sounds[noise] = new_segment
 
         return mixed_with_car_sounds
+
+    def white_noise(self, samples: np.ndarray) -> np.ndarray:
+        """
+        White noise of shape (frames, 1) for `samples`, normalized to -1 to 1.
+        """
+        if self.seed is None:
+            rng = np.random.default_rng()
+        else:
+            rng = np.random.default_rng([self.seed, zlib.crc32(samples.tobytes())])
+        noise = rng.standard_normal((len(samples), 1), dtype=np.float32)
+        noise /= np.max(np.abs(noise))
+        return noise
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+from pydub import AudioSegment
+
+from . import AudioProcessor
+
+
+class ProcessedAudioCache:
+    """
+    On-disk cache of `AudioProcessor.process_file` results.
+
+    Entries are keyed by a hash of the source file's contents and the processor's
+    `config`, and each entry stores the raw PCM of every variant in one `.npz`
+    file. When the cache grows past `max_bytes`, the least recently used entries
+    are evicted.
+    """
+
+    def __init__(self, cache_dir: os.PathLike, max_bytes: int = 2 * 1024**3):
+        """
+        :param cache_dir: Directory holding the cache entries.
+        :param max_bytes: Size the cache directory is kept under.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.size = sum(path.stat().st_size for path in self.entries())
+
+    def entries(self) -> list:
+        return list(self.cache_dir.glob("*.npz"))
+
+    def key(self, processor: AudioProcessor, audio_file_path: os.PathLike) -> str:
+        digest = hashlib.sha1()
+        with open(audio_file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        digest.update(json.dumps(processor.config, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def get_or_process(
+        self, processor: AudioProcessor, audio_file_path: os.PathLike
+    ) -> dict:
+        """
+        Returns the processed variants of a file, running the processor only if
+        they are not cached yet.
+        """
+        entry = self.cache_dir / f"{self.key(processor, audio_file_path)}.npz"
+        audios = self.load(entry)
+        if audios is not None:
+            return audios
+
+        audios = processor.process_file(audio_file_path)
+        self.store(entry, audios)
+        return audios
+
+    def load(self, entry: Path) -> Optional[dict]:
+        try:
+            with np.load(entry) as npz:
+                audios = {}
+                for name in npz.files:
+                    if name.endswith("__format"):
+                        continue
+                    frame_rate, sample_width, channels = npz[f"{name}__format"]
+                    audios[name] = AudioSegment(
+                        npz[name].tobytes(),
+                        frame_rate=int(frame_rate),
+                        sample_width=int(sample_width),
+                        channels=int(channels),
+                    )
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cache entry {entry}: {e}")
+            entry.unlink(missing_ok=True)
+            return None
+
+        # mark as recently used for eviction
+        os.utime(entry)
+        return audios
+
+    def store(self, entry: Path, audios: dict):
+        arrays = {}
+        for name, audio in audios.items():
+            arrays[name] = np.frombuffer(audio.raw_data, dtype=np.uint8)
+            arrays[f"{name}__format"] = np.array(
+                [audio.frame_rate, audio.sample_width, audio.channels]
+            )
+
+        # write then rename, so concurrent readers never see a partial entry
+        tmp = entry.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, entry)
+
+        self.size += entry.stat().st_size
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """
+        Deletes least recently used entries until the cache is 10% below its limit.
+        """
+        entries = []
+        for path in self.entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.size <= 0.9 * self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            self.size -= size
+        logger.info(f"Evicted audio cache down to {self.size} bytes")
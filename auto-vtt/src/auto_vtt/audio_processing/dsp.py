@@ -0,0 +1,95 @@
+"""
+Float32 NumPy versions of the pydub operations used for augmentation.
+
+Audio is handled as float32 arrays of shape (frames, channels) with samples in
+[-1, 1], so gains, mixes and filters are array operations instead of pydub's
+per-sample Python loops.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from pydub import AudioSegment
+
+SAMPLE_DTYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+
+
+def segment_to_array(audio: AudioSegment) -> np.ndarray:
+    """
+    Converts an audio segment to a float32 array of shape (frames, channels).
+    """
+    samples = np.array(audio.get_array_of_samples(), dtype=np.float32)
+    scale = float(1 << (8 * audio.sample_width - 1))
+    return samples.reshape(-1, audio.channels) / scale
+
+
+def array_to_segment(
+    samples: np.ndarray, frame_rate: int, sample_width: int = 2
+) -> AudioSegment:
+    """
+    Converts a float32 array of shape (frames, channels) back to an audio segment,
+    saturating samples outside [-1, 1] like pydub does.
+    """
+    scale = 1 << (8 * sample_width - 1)
+    ints = np.clip(np.round(samples * scale), -scale, scale - 1)
+    return AudioSegment(
+        ints.astype(SAMPLE_DTYPES[sample_width]).tobytes(),
+        frame_rate=frame_rate,
+        sample_width=sample_width,
+        channels=samples.shape[1],
+    )
+
+
+def dbfs(samples: np.ndarray) -> float:
+    """
+    Loudness relative to full scale, as `AudioSegment.dBFS` computes it.
+    """
+    rms = np.sqrt(np.mean(np.square(samples, dtype=np.float64)))
+    if rms == 0:
+        return -float("inf")
+    return float(20 * np.log10(rms))
+
+
+def db_to_gain(db: float) -> float:
+    return 10 ** (db / 20)
+
+
+def mix(audio: np.ndarray, noise: np.ndarray) -> np.ndarray:
+    """
+    Adds `noise` over the start of `audio`, like `AudioSegment.overlay`: the
+    result is as long as `audio` and saturates at full scale.
+    """
+    mixed = audio.copy()
+    overlap = min(len(audio), len(noise))
+    mixed[:overlap] += noise[:overlap]
+    return np.clip(mixed, -1.0, 1.0, out=mixed)
+
+
+@lru_cache(maxsize=None)
+def low_pass_taps(cutoff: float, frame_rate: int, tolerance: float = 1e-5) -> np.ndarray:
+    """
+    FIR taps of pydub's single-pole low-pass filter, truncated once the impulse
+    response falls below `tolerance`.
+    """
+    rc = 1.0 / (2 * np.pi * cutoff)
+    dt = 1.0 / frame_rate
+    alpha = dt / (rc + dt)
+    if alpha >= 1:
+        return np.ones(1, dtype=np.float32)
+
+    num_taps = int(np.ceil(np.log(tolerance) / np.log(1 - alpha))) + 1
+    taps = alpha * (1 - alpha) ** np.arange(num_taps)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+def low_pass(samples: np.ndarray, cutoff: float, frame_rate: int) -> np.ndarray:
+    """
+    Applies pydub's single-pole low-pass filter to every channel. As in pydub,
+    the filter starts settled on the first sample.
+    """
+    taps = low_pass_taps(cutoff, frame_rate)
+    padded = np.pad(samples, ((len(taps) - 1, 0), (0, 0)), mode="edge")
+    filtered = np.empty_like(samples)
+    for channel in range(samples.shape[1]):
+        filtered[:, channel] = np.convolve(padded[:, channel], taps, mode="valid")
+    return filtered
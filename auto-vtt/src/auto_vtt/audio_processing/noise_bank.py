@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+from pydub import AudioSegment
+
+from . import dsp
+
+CAR_SOUNDS_DIR = Path(__file__).parent / "car_sounds"
+CAR_NOISE_PATHS = {
+    "ac": CAR_SOUNDS_DIR / "car_ac.flac",
+    "convo": CAR_SOUNDS_DIR / "car_conversation_music.wav",
+    "radio": CAR_SOUNDS_DIR / "car_radio.wav",
+    "turnsignal": CAR_SOUNDS_DIR / "car_turnsignal.mp3",
+}
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "auto_vtt" / "noise_bank"
+
+
+class NoiseBank:
+    """
+    Car noises decoded once, converted to each requested frame rate and channel
+    count, and persisted as float32 `.npy` files next to their loudness.
+
+    The arrays are opened memory-mapped, so every process using the same cache
+    directory shares one copy in the page cache and only the first one to need
+    a format pays for decoding and resampling.
+    """
+
+    def __init__(
+        self,
+        noise_paths: Optional[dict] = None,
+        cache_dir: os.PathLike = DEFAULT_CACHE_DIR,
+    ):
+        """
+        :param noise_paths: Noise name to audio file. Defaults to the bundled car sounds.
+        :param cache_dir: Directory the converted noises are persisted in.
+        """
+        self.noise_paths = dict(noise_paths or CAR_NOISE_PATHS)
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self.decoded = {}  # noise -> AudioSegment, only filled when building
+        self.arrays = {}  # (noise, frame rate, channels) -> (samples, dBFS)
+
+    def get(self, noise: str, frame_rate: int, channels: int) -> tuple:
+        """
+        Returns a noise as a read-only float32 array of shape (frames, channels)
+        in the given format, along with its loudness in dBFS.
+        """
+        key = (noise, frame_rate, channels)
+        if key not in self.arrays:
+            self.arrays[key] = self.load(*key)
+        return self.arrays[key]
+
+    def entry_path(self, noise: str, frame_rate: int, channels: int) -> Path:
+        # tie entries to the source file, so replacing a noise file rebuilds them
+        source = Path(self.noise_paths[noise]).resolve()
+        stat = source.stat()
+        digest = hashlib.sha1(
+            f"{source}:{stat.st_size}:{stat.st_mtime_ns}".encode()
+        ).hexdigest()[:12]
+        return self.cache_dir / f"{noise}_{frame_rate}hz_{channels}ch_{digest}.npy"
+
+    def load(self, noise: str, frame_rate: int, channels: int) -> tuple:
+        path = self.entry_path(noise, frame_rate, channels)
+        loudness_path = path.with_suffix(".json")
+        # the loudness is written last, so its presence means the entry is complete
+        if not loudness_path.exists():
+            self.build(noise, frame_rate, channels, path, loudness_path)
+
+        samples = np.load(path, mmap_mode="r")
+        loudness = json.loads(loudness_path.read_text())["dbfs"]
+        return samples, loudness
+
+    def build(
+        self,
+        noise: str,
+        frame_rate: int,
+        channels: int,
+        path: Path,
+        loudness_path: Path,
+    ):
+        logger.info(f"Building {noise} noise at {frame_rate} Hz, {channels} channel(s)")
+        if noise not in self.decoded:
+            self.decoded[noise] = AudioSegment.from_file(self.noise_paths[noise])
+
+        audio = self.decoded[noise].set_frame_rate(frame_rate).set_channels(channels)
+        samples = dsp.segment_to_array(audio)
+
+        # write then rename, so concurrent processes never read a partial entry
+        suffix = f".{os.getpid()}.tmp"
+        with open(path.with_suffix(suffix), "wb") as f:
+            np.save(f, samples)
+        os.replace(path.with_suffix(suffix), path)
+
+        loudness_path.with_suffix(suffix).write_text(
+            json.dumps({"dbfs": dsp.dbfs(samples)})
+        )
+        os.replace(loudness_path.with_suffix(suffix), loudness_path)
+
+    def preload(self, frame_rate: int, channels: int = 1):
+        """
+        Makes sure every noise is available in the given format.
+        """
+        for noise in self.noise_paths:
+            self.get(noise, frame_rate, channels)
+
+
+_default_noise_bank = None
+
+
+def default_noise_bank() -> NoiseBank:
+    """
+    Returns the noise bank shared by all `AudioProcessor`s in this process.
+    """
+    global _default_noise_bank
+    if _default_noise_bank is None:
+        _default_noise_bank = NoiseBank()
+    return _default_noise_bank
@@ -1,16 +1,130 @@
-from transformers import pipeline
+from collections import OrderedDict
+from typing import Optional
+import re
+import threading
+
+from loguru import logger
 import torch
 
-classifier = pipeline(
-    "zero-shot-classification", model="MoritzLaurer/DeBERTa-v3-base-mnli-fever-anli"
-)
+DEFAULT_MODEL = "MoritzLaurer/DeBERTa-v3-base-mnli-fever-anli"
+
+pipelines = {}  # (model, device, dtype) -> zero-shot pipeline
+pipelines_lock = threading.Lock()
+
+
+def get_pipeline(model: str, device: torch.device, torch_dtype: torch.dtype):
+    """
+    Returns the zero-shot pipeline for `model` on `device`, loading it on first
+    use. Pipelines are shared by every `ActionClassifier` in the process.
+    """
+    # transformers itself takes seconds to import, so it is only imported here
+    from transformers import pipeline
+
+    key = (model, str(device), str(torch_dtype))
+    with pipelines_lock:
+        if key not in pipelines:
+            logger.info(f"Loading {model} on {device} as {torch_dtype}")
+            pipelines[key] = pipeline(
+                "zero-shot-classification",
+                model=model,
+                device=device,
+                torch_dtype=torch_dtype,
+            )
+        return pipelines[key]
+
+
+def normalize_transcript(text: str) -> str:
+    """
+    Lowercases a transcript and strips its punctuation and extra whitespace, so
+    that phrasings differing only in those share a cache entry.
+    """
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
 
 
 class ActionClassifier:
-    def __init__(self, labels):
+    def __init__(
+        self,
+        labels,
+        cache_size: int = 4096,
+        model: str = DEFAULT_MODEL,
+        device: Optional[str] = None,
+        torch_dtype: Optional[torch.dtype] = None,
+    ):
+        """
+        :param labels: Candidate labels transcripts are classified into.
+        :param cache_size: Number of normalized transcripts whose result is
+            kept. Set to 0 to disable the cache.
+        :param model: Hugging Face zero-shot classification model. It is only
+            loaded on the first classification.
+        :param device: Device to run the model on, defaults to CUDA if available.
+        :param torch_dtype: Model weight dtype, defaults to float16 on CUDA and
+            float32 otherwise.
+        """
         self.labels = labels
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = model
+        self.device = torch.device(
+            device or ("cuda" if torch.cuda.is_available() else "cpu")
+        )
+        if torch_dtype is None:
+            torch_dtype = torch.float16 if self.device.type == "cuda" else torch.float32
+        self.torch_dtype = torch_dtype
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # normalized transcript -> (label, score)
+        # the server classifies from several executor threads
+        self.cache_lock = threading.Lock()
+
+    @property
+    def classifier(self):
+        return get_pipeline(self.model, self.device, self.torch_dtype)
 
     def __call__(self, sequence_to_classify: str) -> tuple[str, float]:
-        out = classifier(sequence_to_classify, self.labels)
-        return (out["labels"][0], out["scores"][0])
+        return self.classify_batch([sequence_to_classify])[0]
+
+    def classify_batch(
+        self, sequences: list, batch_size: int = 16
+    ) -> list[tuple[str, float]]:
+        """
+        Classifies many transcripts against the labels.
+
+        Cached transcripts are answered from the cache and the remaining unique
+        ones are run through the pipeline together, `batch_size` premise and
+        hypothesis pairs per forward pass.
+
+        :param sequences: Transcripts to classify.
+        :param batch_size: Batch size of the zero-shot pipeline.
+        :return: The top (label, score) of each transcript, in input order.
+        """
+        keys = [normalize_transcript(sequence) for sequence in sequences]
+        results = {}
+        with self.cache_lock:
+            for key in keys:
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    results[key] = self.cache[key]
+
+        # normalized text is only the cache key; the model gets the first
+        # original transcript of each key
+        missing = {}
+        for key, sequence in zip(keys, sequences):
+            if key not in results:
+                missing.setdefault(key, sequence)
+        if missing:
+            outs = self.classifier(
+                list(missing.values()), self.labels, batch_size=batch_size
+            )
+            if isinstance(outs, dict):
+                outs = [outs]
+            for key, out in zip(missing, outs):
+                results[key] = (out["labels"][0], out["scores"][0])
+                self.remember(key, results[key])
+
+        return [results[key] for key in keys]
+
+    def remember(self, key: str, result: tuple[str, float]):
+        if self.cache_size <= 0:
+            return
+        with self.cache_lock:
+            self.cache[key] = result
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
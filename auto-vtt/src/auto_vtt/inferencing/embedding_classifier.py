@@ -0,0 +1,134 @@
+from typing import Optional
+import threading
+
+from loguru import logger
+import torch
+
+from .action_classifier import ActionClassifier, normalize_transcript
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+encoders = {}  # (model, device) -> (tokenizer, model)
+encoders_lock = threading.Lock()
+
+
+def get_encoder(model: str, device: torch.device):
+    """
+    Returns the tokenizer and model of the sentence encoder `model` on
+    `device`, loading them on first use. Encoders are shared by every
+    `EmbeddingActionClassifier` in the process.
+    """
+    from transformers import AutoModel, AutoTokenizer
+
+    key = (model, str(device))
+    with encoders_lock:
+        if key not in encoders:
+            logger.info(f"Loading {model} on {device}")
+            tokenizer = AutoTokenizer.from_pretrained(model)
+            encoder = AutoModel.from_pretrained(model).to(device).eval()
+            encoders[key] = (tokenizer, encoder)
+        return encoders[key]
+
+
+class EmbeddingActionClassifier:
+    """
+    Classifies transcripts by cosine similarity between their sentence
+    embedding and the embeddings of the labels.
+
+    The labels are embedded once, so each transcript costs a single encoder
+    pass however many labels there are. Transcripts whose best label doesn't
+    beat the runner-up by `margin` are handed to the zero-shot NLI classifier.
+    """
+
+    def __init__(
+        self,
+        labels,
+        model: str = DEFAULT_EMBEDDING_MODEL,
+        margin: float = 0.05,
+        temperature: float = 0.05,
+        fallback: Optional[ActionClassifier] = None,
+        device: Optional[str] = None,
+    ):
+        """
+        :param labels: Candidate labels transcripts are classified into, e.g.
+            "activate:lights". ':' and '_' are read as spaces when embedding.
+        :param model: Hugging Face sentence encoder, mean pooled.
+        :param margin: Minimum cosine similarity lead of the best label over the
+            second best for a result to be trusted without the fallback.
+        :param temperature: Softmax temperature turning similarities into the
+            returned scores.
+        :param fallback: Classifier for low margin transcripts, defaults to an
+            `ActionClassifier` over the same labels. Pass `margin=0` to never
+            use it.
+        :param device: Device to run the encoder on, defaults to CUDA if available.
+        """
+        self.labels = labels
+        self.model = model
+        self.margin = margin
+        self.temperature = temperature
+        self.fallback = fallback or ActionClassifier(labels, device=device)
+        self.device = torch.device(
+            device or ("cuda" if torch.cuda.is_available() else "cpu")
+        )
+        self.label_embeddings = None
+
+    def __call__(self, sequence_to_classify: str) -> tuple[str, float]:
+        return self.classify_batch([sequence_to_classify])[0]
+
+    @torch.no_grad()
+    def embed(self, texts: list, batch_size: int = 64) -> torch.Tensor:
+        """
+        Embeds texts into unit length vectors, mean pooling the encoder's last
+        hidden state over the non-padding tokens.
+        """
+        tokenizer, encoder = get_encoder(self.model, self.device)
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            inputs = tokenizer(
+                texts[start : start + batch_size],
+                padding=True,
+                truncation=True,
+                return_tensors="pt",
+            ).to(self.device)
+            hidden = encoder(**inputs).last_hidden_state
+            mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            embeddings.append(torch.nn.functional.normalize(pooled, dim=-1))
+        return torch.cat(embeddings)
+
+    def classify_batch(
+        self, sequences: list, batch_size: int = 64
+    ) -> list[tuple[str, float]]:
+        """
+        :param sequences: Transcripts to classify.
+        :param batch_size: Number of transcripts per encoder pass.
+        :return: The top (label, score) of each transcript, in input order.
+        """
+        if not sequences:
+            return []
+        if self.label_embeddings is None:
+            self.label_embeddings = self.embed(
+                [label.replace(":", " ").replace("_", " ") for label in self.labels]
+            )
+
+        embeddings = self.embed(
+            [normalize_transcript(sequence) for sequence in sequences], batch_size
+        )
+        similarities = embeddings @ self.label_embeddings.T
+        scores = torch.softmax(similarities / self.temperature, dim=-1)
+        top = similarities.topk(min(2, len(self.labels)), dim=-1)
+
+        results = [
+            (self.labels[idx], float(scores[i, idx]))
+            for i, idx in enumerate(top.indices[:, 0].tolist())
+        ]
+        if len(self.labels) > 1:
+            margins = (top.values[:, 0] - top.values[:, 1]).tolist()
+            uncertain = [i for i, margin in enumerate(margins) if margin < self.margin]
+            if uncertain:
+                fallback_results = self.fallback.classify_batch(
+                    [sequences[i] for i in uncertain]
+                )
+                for i, result in zip(uncertain, fallback_results):
+                    results[i] = result
+        return results
@@ -0,0 +1,291 @@
+import enum
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+from loguru import logger
+
+from ..speech_to_text import SpeechToTextConverter
+
+ModelSize = SpeechToTextConverter.ModelSize
+
+
+class Location(enum.Enum):
+    LOCAL = "local"  # on the car, with `SpeechToTextConverter`
+    REMOTE = "remote"  # on the server, streamed with `VariableRateStreamerClient`
+
+
+@dataclass(frozen=True)
+class ModelProfile:
+    """
+    Benchmarked cost and accuracy of a model size at one location, e.g. from
+    `ModelSizeTester` runs on the car and on the server.
+
+    Whisper pads every clip to a 30 second window, so compute time is mostly a
+    fixed cost per utterance, with `seconds_per_audio_second` covering the rest.
+    """
+
+    location: Location
+    model_size: ModelSize
+    compute_seconds: float
+    wer: float
+    seconds_per_audio_second: float = 0.0
+
+
+@dataclass
+class Decision:
+    profile: ModelProfile
+    expected_latency: float
+    # expected latency of every candidate that met the accuracy floor
+    candidates: Dict[ModelProfile, float]
+    # chosen to measure a missing or stale link rather than for its latency
+    explore: bool = False
+
+    @property
+    def location(self) -> Location:
+        return self.profile.location
+
+    @property
+    def model_size(self) -> ModelSize:
+        return self.profile.model_size
+
+
+class LinkEstimator:
+    """
+    Live estimate of the car's uplink, smoothed with exponentially weighted
+    moving averages so a single delayed ack doesn't flip every decision.
+    RTT is tracked like TCP does, as a smoothed mean and mean deviation.
+    """
+
+    def __init__(self, alpha: float = 0.125, beta: float = 0.25):
+        """
+        :param alpha: Weight of a new sample in the RTT and throughput averages.
+        :param beta: Weight of a new sample in the RTT deviation.
+        """
+        self.alpha = alpha
+        self.beta = beta
+        self.rtt = None  # seconds
+        self.rtt_deviation = None
+        self.throughput = None  # bits per second
+        self.updated_at = None  # time.monotonic() of the last sample
+        self.client_rtts_seen = 0
+        self.client_throughputs_seen = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.rtt is not None and self.throughput is not None
+
+    @property
+    def age(self) -> float:
+        """
+        Seconds since the last sample, infinite if there was none.
+        """
+        if self.updated_at is None:
+            return float("inf")
+        return time.monotonic() - self.updated_at
+
+    def observe_rtt(self, rtt: float):
+        self.updated_at = time.monotonic()
+        if self.rtt is None:
+            self.rtt = rtt
+            self.rtt_deviation = rtt / 2
+            return
+        self.rtt_deviation += self.beta * (abs(rtt - self.rtt) - self.rtt_deviation)
+        self.rtt += self.alpha * (rtt - self.rtt)
+
+    def observe_throughput(self, throughput: float):
+        self.updated_at = time.monotonic()
+        if self.throughput is None:
+            self.throughput = throughput
+            return
+        self.throughput += self.alpha * (throughput - self.throughput)
+
+    def observe_transfer(self, timings: list):
+        """
+        Update the estimates from the per-chunk timings of a finished stream,
+        as returned by `VariableRateStreamerClient.stream_chunks`. The first
+        chunk's ack latency is taken as an RTT sample, since nothing was queued
+        ahead of it, and the whole stream as a throughput sample.
+        """
+        acked = [t for t in timings if t["acked_at"] is not None]
+        if not acked:
+            return
+        self.observe_rtt(acked[0]["acked_at"] - acked[0]["sent_at"])
+        elapsed = acked[-1]["acked_at"] - acked[0]["sent_at"]
+        if elapsed > 0:
+            self.observe_throughput(sum(t["bytes"] for t in acked) * 8 / elapsed)
+
+    def observe_client(self, client):
+        """
+        Fold in the RTTs and throughputs a `VariableRateStreamerClient`
+        measured with pings while streaming adaptively since the last call.
+        """
+        for rtt in client.rtts[self.client_rtts_seen :]:
+            self.observe_rtt(rtt)
+        for throughput in client.throughputs[self.client_throughputs_seen :]:
+            self.observe_throughput(throughput)
+        self.client_rtts_seen = len(client.rtts)
+        self.client_throughputs_seen = len(client.throughputs)
+
+    async def probe(self, client) -> float:
+        """
+        Measure the RTT with a ping over the client's connection, connecting
+        first if needed. Cheap enough to refresh a stale estimate between
+        utterances; throughput is only learnt from actual transfers.
+
+        :return: The measured RTT in seconds.
+        """
+        await client.ensure_connected()
+        rtt = await client.measure_rtt(client.conn)
+        self.observe_rtt(rtt)
+        return rtt
+
+    def transfer_latency(self, audio_bytes: int) -> float:
+        """
+        Expected time from the start of an upload until its result is back:
+        the upload itself plus a round trip for the final ack and the result.
+        """
+        return audio_bytes * 8 / self.throughput + self.rtt
+
+
+class OffloadScheduler:
+    """
+    Decides per utterance whether to transcribe it on the car or stream it to
+    the server, and with which model size.
+
+    Every candidate meeting the accuracy floor is scored by its expected
+    end-to-end latency: its compute time, plus the transfer time under the
+    current link estimates for remote candidates. The fastest one wins.
+
+    Without a measured link, remote candidates can't be scored, and the link is
+    only measured by using it. So while the estimate is missing or older than
+    `max_link_age`, every `explore_every`-th decision goes to the fastest
+    computing remote candidate instead; its transfer, fed back through
+    `LinkEstimator.observe_transfer`, refreshes the estimate. The other
+    decisions use the last estimate, or stay local if there is none. Pings
+    (`LinkEstimator.probe`, `LinkEstimator.observe_client`) refresh the RTT
+    without a transfer.
+    """
+
+    def __init__(
+        self,
+        profiles: Iterable[ModelProfile],
+        max_wer: Optional[float] = None,
+        link: Optional[LinkEstimator] = None,
+        alpha: float = 0.125,
+        max_link_age: Optional[float] = 60.0,
+        explore_every: int = 10,
+    ):
+        """
+        :param profiles: Benchmarked candidates, local and remote.
+        :param max_wer: Accuracy floor; candidates with a higher WER are never
+            chosen. If none meets it, the most accurate candidate is used.
+        :param link: Estimator of the uplink, a new one by default.
+        :param alpha: Weight of a measured compute time in a candidate's
+            running compute latency estimate.
+        :param max_link_age: Seconds after which link estimates are stale and
+            remote candidates are explored again. They never go stale if None.
+        :param explore_every: Decisions between explorations while the link is
+            unmeasured or stale. The first such decision always explores.
+        """
+        self.profiles = list(profiles)
+        if not self.profiles:
+            raise ValueError("At least one model profile is required")
+        self.max_wer = max_wer
+        self.link = link or LinkEstimator()
+        self.alpha = alpha
+        # live compute latency estimates, seeded from the benchmarks
+        self.compute_seconds = {p: p.compute_seconds for p in self.profiles}
+        self.max_link_age = max_link_age
+        self.explore_every = explore_every
+        # so the first decision without a fresh link explores
+        self.decisions_since_exploring = explore_every - 1
+
+    @property
+    def link_fresh(self) -> bool:
+        return self.link.ready and (
+            self.max_link_age is None or self.link.age <= self.max_link_age
+        )
+
+    def observe_compute(
+        self, profile: ModelProfile, seconds: float, audio_seconds: float = 0.0
+    ):
+        """
+        Fold a measured compute time into a candidate's estimate. For remote
+        candidates this is the server's time after the last chunk, so queueing
+        on a busy server is accounted for.
+        """
+        fixed = seconds - profile.seconds_per_audio_second * audio_seconds
+        self.compute_seconds[profile] += self.alpha * (
+            fixed - self.compute_seconds[profile]
+        )
+
+    def expected_latency(
+        self, profile: ModelProfile, audio_bytes: int, audio_seconds: float
+    ) -> float:
+        latency = (
+            self.compute_seconds[profile]
+            + profile.seconds_per_audio_second * audio_seconds
+        )
+        if profile.location is Location.REMOTE:
+            latency += self.link.transfer_latency(audio_bytes)
+        return latency
+
+    def eligible(self) -> list:
+        """
+        Candidates that can be chosen right now.
+        """
+        profiles = self.profiles
+        if self.max_wer is None:
+            return profiles
+
+        accurate = [p for p in profiles if p.wer <= self.max_wer]
+        if not accurate:
+            best = min(profiles, key=lambda p: p.wer)
+            logger.warning(
+                f"No model meets WER {self.max_wer}, using {best.location.value} "
+                f"{best.model_size.value} (WER {best.wer})"
+            )
+            return [best]
+        return accurate
+
+    def choose(self, audio_bytes: int, audio_seconds: float) -> Decision:
+        """
+        Pick where and with which model size to transcribe an utterance.
+
+        :param audio_bytes: Size of the audio as it would be uploaded.
+        :param audio_seconds: Duration of the audio.
+        """
+        candidates = {
+            p: self.expected_latency(p, audio_bytes, audio_seconds)
+            if p.location is Location.LOCAL or self.link.ready
+            else float("inf")
+            for p in self.eligible()
+        }
+        remote = [p for p in candidates if p.location is Location.REMOTE]
+
+        explore = False
+        if self.link_fresh:
+            # explore right away once the estimate goes stale
+            self.decisions_since_exploring = self.explore_every - 1
+        elif remote:
+            self.decisions_since_exploring += 1
+            explore = self.decisions_since_exploring >= self.explore_every
+            if explore:
+                self.decisions_since_exploring = 0
+
+        if explore:
+            profile = min(remote, key=lambda p: (self.compute_seconds[p], p.wer))
+        else:
+            # ties go to the more accurate model
+            profile = min(candidates, key=lambda p: (candidates[p], p.wer))
+        reason = (
+            "to measure the link"
+            if explore
+            else f"expecting {candidates[profile]:.3f}s"
+        )
+        logger.debug(
+            f"Transcribing {audio_seconds:.1f}s of audio with "
+            f"{profile.model_size.value} ({profile.location.value}), {reason}"
+        )
+        return Decision(profile, candidates[profile], candidates, explore)
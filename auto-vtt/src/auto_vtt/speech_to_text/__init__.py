@@ -1,6 +1,6 @@
 import enum
 import os
-import tempfile
+from typing import Optional, Union
 from loguru import logger
 import torch
 import whisper
@@ -9,6 +9,24 @@ import librosa
 
 from pydub import AudioSegment
 
+from ..audio_processing import dsp
+from .registry import ModelRegistry, default_model_registry, model_lock
+
+
+def audio_segment_to_array(audio: AudioSegment) -> np.ndarray:
+    """
+    Converts an audio segment to the 16 kHz mono float32 array whisper expects,
+    without going through a file or ffmpeg.
+
+    Args:
+        audio (AudioSegment): The audio to convert.
+
+    Returns:
+        np.ndarray: Samples in [-1, 1] at `whisper.audio.SAMPLE_RATE`.
+    """
+    audio = audio.set_channels(1).set_frame_rate(whisper.audio.SAMPLE_RATE)
+    return dsp.segment_to_array(audio)[:, 0]
+
 
 class SpeechToTextConverter:
     class ModelSize(enum.Enum):
@@ -18,8 +36,53 @@ class SpeechToTextConverter:
         MEDIUM = "medium"
         LARGE = "large"
 
-    def __init__(self, model_size: ModelSize):
-        self.model = whisper.load_model(model_size.value + ".en")
+    def __init__(
+        self,
+        model_size: ModelSize,
+        device: Optional[str] = None,
+        quantized: bool = False,
+        registry: Optional[ModelRegistry] = None,
+    ):
+        """
+        Args:
+            model_size (ModelSize): Size of the English whisper model to use.
+            device (str): Device to run on, defaults to CUDA if available.
+            quantized (bool): Use an int8 dynamically quantized model. CPU only.
+            registry (ModelRegistry): Where the model is loaded from and kept,
+                defaults to the registry shared by the whole process.
+        """
+        registry = registry or default_model_registry()
+        self.model = registry.get(model_size.value + ".en", device, quantized)
+        # shared with every converter using the same model; see `model_lock`
+        self.lock = model_lock(self.model)
+
+    @classmethod
+    def preload(
+        cls,
+        model_sizes: list,
+        device: Optional[str] = None,
+        quantized: bool = False,
+        registry: Optional[ModelRegistry] = None,
+    ):
+        """
+        Loads models into the registry ahead of the first converter using them,
+        e.g. to keep the sizes a server serves warm.
+
+        Args:
+            model_sizes (list[ModelSize]): Sizes to load.
+        """
+        registry = registry or default_model_registry()
+        registry.preload(
+            [model_size.value + ".en" for model_size in model_sizes], device, quantized
+        )
+
+    @property
+    def fp16(self) -> bool:
+        """
+        Whether to run inference in half precision. Only CUDA models can; a model
+        on the CPU, e.g. a quantized one, needs float32 even on a CUDA host.
+        """
+        return self.model.device.type == "cuda"
 
     def transcribe_file(self, audio_path: os.PathLike) -> str:
         """
@@ -31,24 +94,81 @@ class SpeechToTextConverter:
         Returns:
             str: Transcribed text.
         """
-        fp16_supported = torch.cuda.is_available()
+        with self.lock:
+            result = self.model.transcribe(str(audio_path), fp16=self.fp16)
+        return result["text"].strip()
+
+    def transcribe_array(self, samples: np.ndarray) -> str:
+        """
+        Transcribes speech from a 16 kHz mono float32 NumPy array.
 
-        result = self.model.transcribe(str(audio_path), fp16=fp16_supported)
+        Args:
+            samples (np.ndarray): The audio signal, as returned by `audio_segment_to_array`.
+
+        Returns:
+            str: Transcribed text.
+        """
+        with self.lock:
+            result = self.model.transcribe(samples, fp16=self.fp16)
         return result["text"].strip()
 
-    def transcribe(self, audio: AudioSegment) -> str:
+    def transcribe(self, audio: Union[AudioSegment, np.ndarray, os.PathLike]) -> str:
         """
-        Transcribes speech from a NumPy array representing sound.
+        Transcribes speech from an audio segment, a 16 kHz float32 NumPy array or
+        an audio file path. Segments are converted in memory, not via a temp file.
 
         Args:
-            audio_array (np.ndarray): The audio signal as a NumPy array.
-            sample_rate (int): The sample rate of the audio signal.
+            audio (AudioSegment | np.ndarray | os.PathLike): The audio to transcribe.
 
         Returns:
             str: Transcribed text.
         """
-        # write the audio file to a temporary file
-        audio_path = tempfile.mktemp(suffix=".wav")
-        audio.export(audio_path, format="wav")
+        if isinstance(audio, (str, os.PathLike)):
+            return self.transcribe_file(audio)
+        if isinstance(audio, AudioSegment):
+            audio = audio_segment_to_array(audio)
+
+        return self.transcribe_array(audio)
+
+    def transcribe_batch(self, audios: list, batch_size: int = 16) -> list:
+        """
+        Transcribes many short clips, running the encoder and decoder once per
+        batch of padded mel spectrograms instead of once per clip. Clips are
+        padded or trimmed to whisper's 30 second window, so this is meant for
+        short commands rather than long recordings.
+
+        Args:
+            audios (list): Audio segments or 16 kHz float32 NumPy arrays.
+            batch_size (int): Number of clips decoded together.
+
+        Returns:
+            list[str]: Transcribed texts, in input order.
+        """
+        options = whisper.DecodingOptions(
+            language="en",
+            without_timestamps=True,
+            fp16=self.fp16,
+        )
+
+        texts = []
+        for start in range(0, len(audios), batch_size):
+            mels = torch.stack(
+                [self.log_mel(audio) for audio in audios[start : start + batch_size]]
+            )
+            with self.lock:
+                results = whisper.decode(self.model, mels, options)
+            texts.extend(result.text.strip() for result in results)
+
+        return texts
+
+    def log_mel(self, audio: Union[AudioSegment, np.ndarray]) -> torch.Tensor:
+        """
+        Computes the padded log-mel spectrogram of a clip on the model's device.
+        """
+        if isinstance(audio, AudioSegment):
+            audio = audio_segment_to_array(audio)
 
-        return self.transcribe_file(audio_path)
+        audio = whisper.pad_or_trim(torch.from_numpy(audio))
+        return whisper.log_mel_spectrogram(
+            audio, n_mels=self.model.dims.n_mels, device=self.model.device
+        )
@@ -0,0 +1,143 @@
+from collections import OrderedDict
+from typing import Optional
+import threading
+import time
+import weakref
+
+from loguru import logger
+import torch
+import whisper
+
+
+def model_bytes(model: torch.nn.Module) -> int:
+    """
+    Memory held by a model's weights, including the packed weights of
+    dynamically quantized layers, which are not parameters.
+    """
+    total = 0
+    for value in model.state_dict().values():
+        tensors = value if isinstance(value, tuple) else (value,)
+        for tensor in tensors:
+            if isinstance(tensor, torch.Tensor):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def quantize(model: whisper.Whisper) -> whisper.Whisper:
+    """
+    Converts a model's linear layers to dynamically quantized int8 ones, which
+    are smaller and faster on CPU.
+    """
+    # whisper's Linear only adds a dtype cast to nn.Linear, and quantize_dynamic
+    # only replaces modules whose type is exactly nn.Linear
+    for module in model.modules():
+        if isinstance(module, whisper.model.Linear):
+            module.__class__ = torch.nn.Linear
+    return torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+_model_locks = weakref.WeakKeyDictionary()  # model -> lock
+_model_locks_lock = threading.Lock()
+
+
+def model_lock(model: torch.nn.Module) -> threading.Lock:
+    """
+    The lock inference on `model` must hold. Whisper's decoder keeps its
+    key/value cache in hooks installed on the model's own modules, so two
+    threads decoding with the same model at once corrupt each other's cache.
+    """
+    with _model_locks_lock:
+        if model not in _model_locks:
+            _model_locks[model] = threading.Lock()
+        return _model_locks[model]
+
+
+class ModelRegistry:
+    """
+    Whisper models loaded in this process, shared by every
+    `SpeechToTextConverter` asking for the same model.
+
+    When the loaded models exceed `memory_budget`, the least recently used ones
+    are dropped, so evaluations sweeping through model sizes don't keep every
+    size in memory.
+    """
+
+    def __init__(self, memory_budget: Optional[int] = None):
+        """
+        :param memory_budget: Bytes of weights to keep loaded, unlimited if None.
+            The most recently requested model is always kept.
+        """
+        self.memory_budget = memory_budget
+        self.models = OrderedDict()  # (name, device, quantized) -> (model, bytes)
+        self.lock = threading.Lock()
+
+    @property
+    def loaded_bytes(self) -> int:
+        return sum(size for _, size in self.models.values())
+
+    def get(
+        self, name: str, device: Optional[str] = None, quantized: bool = False
+    ) -> whisper.Whisper:
+        """
+        Returns a loaded model, loading it on first use.
+
+        :param name: Whisper model name, e.g. "tiny.en".
+        :param device: Device to load the model on, defaults to CUDA if available.
+        :param quantized: Use int8 dynamic quantization. CPU only.
+        """
+        device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        if quantized and torch.device(device).type != "cpu":
+            raise ValueError("Quantized models can only run on the CPU")
+
+        key = (name, str(device), quantized)
+        with self.lock:
+            if key in self.models:
+                self.models.move_to_end(key)
+                return self.models[key][0]
+
+            start = time.perf_counter()
+            model = whisper.load_model(name, device=device)
+            if quantized:
+                model = quantize(model)
+            size = model_bytes(model)
+            logger.info(
+                f"Loaded {name} on {device}{' (int8)' if quantized else ''}: "
+                f"{size / 2**20:.0f} MiB in {time.perf_counter() - start:.1f}s"
+            )
+
+            self.models[key] = (model, size)
+            self.evict()
+            return model
+
+    def preload(
+        self, names: list, device: Optional[str] = None, quantized: bool = False
+    ):
+        """
+        Loads models ahead of their first request, e.g. the sizes a server serves.
+        """
+        for name in names:
+            self.get(name, device, quantized)
+
+    def evict(self):
+        if self.memory_budget is None:
+            return
+        while len(self.models) > 1 and self.loaded_bytes > self.memory_budget:
+            (name, device, _), _ = self.models.popitem(last=False)
+            logger.info(f"Unloading {name} on {device}")
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+_default_registry = None
+
+
+def default_model_registry() -> ModelRegistry:
+    """
+    Returns the model registry shared by all `SpeechToTextConverter`s in this process.
+    """
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = ModelRegistry()
+    return _default_registry
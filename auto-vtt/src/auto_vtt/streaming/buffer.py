@@ -0,0 +1,149 @@
+import asyncio
+import os
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+
+class ReceiveBuffer:
+    """
+    Ring buffer holding the most recent `capacity` bytes a stream received.
+
+    Chunks are copied into the ring once and handed to consumers as memoryviews
+    of it, so nothing is written to disk per chunk. The ring starts empty and
+    doubles as the stream grows until it reaches `capacity`, so short
+    utterances only hold what they sent. Only when a
+    stream outgrows the ring are its oldest bytes moved out: appended to
+    `spill_path` if set, dropped otherwise. `archive` writes the whole stream to
+    a file on request.
+    """
+
+    def __init__(self, capacity: int = 1 << 20, spill_path: Optional[Path] = None):
+        """
+        :param capacity: Size of the ring in bytes, the memory cap of a stream.
+        :param spill_path: File bytes evicted from the ring are appended to.
+            Evicted bytes are lost if None.
+        """
+        self.capacity = capacity
+        self.buffer = bytearray()
+        self.view = memoryview(self.buffer)
+        self.spill_path = Path(spill_path) if spill_path is not None else None
+        self.spill_file = None
+
+        self.total = 0  # bytes received
+        self.size = 0  # bytes held in the ring, the last `size` of `total`
+        self.spilled = 0
+        self.dropped = 0
+
+    def append(self, chunk) -> tuple:
+        """
+        Copy a chunk into the ring, evicting the oldest bytes if it is full.
+
+        :return: One or two memoryviews of the ring (two if the chunk wrapped
+            around its end) holding the chunk. They stay valid until `capacity`
+            more bytes have been appended. A chunk larger than the whole ring is
+            returned as a view of itself.
+        """
+        chunk = whole = memoryview(chunk).cast("B")
+        self.reserve(self.size + len(chunk))
+        overflow = self.size + len(chunk) - self.capacity
+        if overflow > 0:
+            from_ring = min(overflow, self.size)
+            for segment in self.segments(self.total - self.size, from_ring):
+                self.evict(segment)
+            self.size -= from_ring
+            if overflow > from_ring:
+                # the chunk alone is larger than the ring
+                self.evict(chunk[: overflow - from_ring])
+                self.total += overflow - from_ring
+                chunk = chunk[overflow - from_ring :]
+
+        position = self.total % self.capacity
+        first = min(len(chunk), self.capacity - position)
+        self.view[position : position + first] = chunk[:first]
+        self.view[: len(chunk) - first] = chunk[first:]
+
+        start = self.total
+        self.total += len(chunk)
+        self.size += len(chunk)
+        if len(whole) > self.capacity:
+            return (whole,)
+        return self.segments(start, len(chunk))
+
+    def reserve(self, size: int):
+        """
+        Grow the ring to hold `size` bytes, up to `capacity`. Views returned
+        before keep pointing at the old, still intact buffer.
+        """
+        if size <= len(self.buffer) or len(self.buffer) == self.capacity:
+            return
+        buffer = bytearray(min(self.capacity, max(size, 2 * len(self.buffer))))
+        # nothing was evicted or wrapped yet, so the stream starts at offset 0
+        buffer[: self.size] = self.view[: self.size]
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+
+    async def append_async(self, chunk) -> tuple:
+        """
+        `append`, moved to a thread when it has to spill to disk.
+        """
+        if self.spill_path is not None and self.size + len(chunk) > self.capacity:
+            return await asyncio.to_thread(self.append, chunk)
+        return self.append(chunk)
+
+    def segments(self, offset: int, length: int) -> tuple:
+        """
+        Views of the ring holding `length` bytes from stream offset `offset`.
+        """
+        position = offset % self.capacity
+        first = min(length, self.capacity - position)
+        if first == length:
+            return (self.view[position : position + length],)
+        return (self.view[position:], self.view[: length - first])
+
+    def contents(self) -> tuple:
+        """
+        Views of all bytes held in the ring, oldest first.
+        """
+        return self.segments(self.total - self.size, self.size)
+
+    def evict(self, data: memoryview):
+        if self.spill_path is None:
+            self.dropped += len(data)
+            return
+        if self.spill_file is None:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            self.spill_file = open(self.spill_path, "wb")
+            logger.debug(f"Spilling to {self.spill_path}")
+        self.spill_file.write(data)
+        self.spilled += len(data)
+
+    def archive(self, path: Path):
+        """
+        Write everything received to `path`: the spilled bytes followed by the
+        ring's contents. Blocking; run it in a thread from the event loop.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+            os.replace(self.spill_path, path)
+            mode = "ab"
+        else:
+            mode = "wb"
+        with open(path, mode) as f:
+            for segment in self.contents():
+                f.write(segment)
+        if self.dropped:
+            logger.warning(f"{path} is missing the first {self.dropped} bytes")
+
+    def close(self):
+        """
+        Release the spill file. Spilled bytes that were not archived are deleted.
+        """
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+            self.spill_path.unlink(missing_ok=True)
@@ -1,4 +1,5 @@
 import asyncio
+import math
 from loguru import logger
 import websockets
 import json
@@ -6,7 +7,39 @@ import time
 from pathlib import Path
 from subprocess import PIPE
 import statistics
+import uuid
+import wave
 import fire
+from websockets.protocol import State
+
+from .protocol import FRAMING_HEADER, PROTOCOL_VERSION, Codec, encode_frame
+
+# ffmpeg raw PCM formats by WAV sample width in bytes
+PCM_FORMATS = {1: "u8", 2: "s16le", 3: "s24le", 4: "s32le"}
+# Seconds of input ffmpeg holds back before its output catches up: the raw PCM
+# demuxer reads packets of up to 100ms, then resampling and LAME add their
+# delay and a frame. About 0.16s measured at 16kHz, doubled for margin.
+ENCODER_DELAY = 0.3
+
+
+class PendingUtterance:
+    """
+    Client side state of an utterance submitted with
+    `VariableRateStreamerClient.submit`.
+    """
+
+    def __init__(self, max_in_flight: int):
+        self.stream_id = uuid.uuid4()
+        self.id = self.stream_id.hex
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.timings = []  # as returned by `send_chunks`
+        self.partials = []
+        self.result = None  # resolved with the final message once done
+        self.done = asyncio.get_running_loop().create_future()
+
+    def ack(self, seq: int):
+        self.timings[seq]["acked_at"] = time.perf_counter()
+        self.in_flight.release()
 
 
 class VariableRateStreamerClient:
@@ -17,6 +50,12 @@ class VariableRateStreamerClient:
         initial_bitrate: int = 128000,
         encoding_params: dict = None,
         adaptation_interval: int = 10,  # Only adapt every N chunks
+        ladder: bool = False,  # Keep a warm encoder per bitrate step
+        framing: bool = True,  # Prefix chunks with a protocol.Frame header
+        compression: str = "deflate",  # WebSocket compression, None to disable
+        keepalive: float = 20.0,  # Seconds between keepalive pings, None to disable
+        max_reconnects: int = 5,  # Attempts to (re)connect before giving up
+        reconnect_delay: float = 0.5,  # First backoff delay, doubled per attempt
     ):
         self.server_uri = server_uri
         self.chunk_size = chunk_size
@@ -24,10 +63,18 @@ class VariableRateStreamerClient:
 
         self.rtts = []
         self.throughputs = []
+        self.rtt_task = None  # ping measuring the RTT while streaming
         self.min_bitrate = 64000
         self.max_bitrate = 320000
         self.bitrate_step = 32000
 
+        self.ladder = ladder
+        if ladder:
+            # snap to the ladder so every bitrate update_profile picks is warm
+            self.current_bitrate = min(
+                self.bitrate_ladder, key=lambda b: abs(b - initial_bitrate)
+            )
+
         self.encoding_params = encoding_params or {
             "audio_codec": "libmp3lame",
             "b:a": str(self.current_bitrate),
@@ -36,6 +83,16 @@ class VariableRateStreamerClient:
             "format": "mp3",
         }
 
+        self.framing = framing
+        self.compression = compression
+        self.keepalive = keepalive
+        self.max_reconnects = max_reconnects
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = 10.0
+        self.stream_id = None  # session UUID sent in the frame headers
+        self.codec = None  # codec of the current stream, sniffed if None
+        self.sent_bitrate = 0  # bitrate of the chunk being sent, 0 if unknown
+
         self.conn = None
         self.encoder = None
         self.encoder_queue = asyncio.Queue()
@@ -44,25 +101,82 @@ class VariableRateStreamerClient:
         self.chunk_count = 0
         self.adaptation_interval = adaptation_interval
         self.pending_bitrate_change = False
-        
+        self.chunk_timings = []
+        self.partials = []  # partial transcripts of the current stream
+        self.result = None  # final transcript, intent and server timings
+
+        self.original_file_path = None
+        self.input_params = None
+        self.window_start = None
+        self.window_bytes = 0
+        self.frames_fed = 0
+        self.switches = []  # (seconds into the input, new bitrate)
+        self.feed_credits = None
+        self.blocks_released = 0
+        self.seconds_sent = 0.0
+
+        self.pending = {}  # request id -> PendingUtterance
+        self.completed = asyncio.Queue()  # finished PendingUtterances
+        self.receiver_task = None
+        self.sender_tasks = set()  # the event loop only keeps weak references
+
+        self.warm_encoders = {}
+        self.warm_params = None
+        self.warm_tasks = set()
+
+    @property
+    def bitrate_ladder(self) -> list:
+        return list(range(self.min_bitrate, self.max_bitrate + 1, self.bitrate_step))
 
     async def start_encoder(self):
         """
-        Start the ffmpeg encoder as a subprocess.
+        Start the ffmpeg encoder for the current bitrate, reusing a warm encoder
+        from the ladder if one is available.
+        """
+        bitrate = int(self.encoding_params["b:a"])
+        self.encoder = self.warm_encoders.pop(bitrate, None)
+        if self.encoder is None:
+            self.encoder = await self.spawn_encoder(bitrate)
+
+        self.encoder_task = asyncio.create_task(self.read_encoder_output())
+
+    async def spawn_encoder(self, bitrate: int):
+        """
+        Start an ffmpeg encoder subprocess for the given bitrate. The encoder
+        reads raw PCM from stdin (see `feed_encoder`), so it can be started
+        ahead of time and swapped in mid-stream.
         """
         cmd = [
             "ffmpeg",
             "-hide_banner",
             "-loglevel",
             "error",
+            # raw PCM needs no probing; without this ffmpeg holds back output
+            "-probesize",
+            "32",
+            "-analyzeduration",
+            "0",
+            "-f",
+            PCM_FORMATS[self.input_params["sample_width"]],
+            "-ar",
+            str(self.input_params["ar"]),
+            "-ac",
+            str(self.input_params["ac"]),
             "-i",
-            str(self.original_file_path),
+            "pipe:0",
             "-f",
             "mp3",
+            # no Xing header, so consecutive encoder outputs concatenate cleanly
+            "-write_xing",
+            "0",
+            "-id3v2_version",
+            "0",
+            "-flush_packets",
+            "1",
             "-codec:a",
             self.encoding_params["audio_codec"],
             "-b:a",
-            self.encoding_params["b:a"],
+            str(bitrate),
             "-ar",
             self.encoding_params["ar"],
             "-ac",
@@ -70,61 +184,356 @@ class VariableRateStreamerClient:
             "pipe:1",
         ]
 
-        self.encoder = await asyncio.create_subprocess_exec(
+        return await asyncio.create_subprocess_exec(
             *cmd,
             stdin=PIPE,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
         )
 
-        self.encoder_task = asyncio.create_task(self.read_encoder_output())
-        
+    async def warm_up_encoders(self):
+        """
+        Make sure an idle encoder is waiting for every ladder step other than the
+        current bitrate. Warm encoders are discarded if the input format changed.
+        """
+        if self.warm_params != self.input_params:
+            self.close_encoders()
+            self.warm_params = dict(self.input_params)
+
+        bitrates = [
+            b
+            for b in self.bitrate_ladder
+            if b != self.current_bitrate and b not in self.warm_encoders
+        ]
+        encoders = await asyncio.gather(*(self.spawn_encoder(b) for b in bitrates))
+        self.warm_encoders.update(zip(bitrates, encoders))
+
+    async def replace_warm_encoder(self, bitrate: int):
+        """
+        Spawn a fresh warm encoder for a bitrate whose encoder was just used up.
+        """
+        if bitrate not in self.warm_encoders:
+            self.warm_encoders[bitrate] = await self.spawn_encoder(bitrate)
+
+    def close_encoders(self):
+        """
+        Kill all idle warm encoders.
+        """
+        for task in self.warm_tasks:
+            task.cancel()
+        for encoder in self.warm_encoders.values():
+            if encoder.returncode is None:
+                encoder.kill()
+        self.warm_encoders.clear()
+
     async def __aenter__(self):
         # await self.start_encoder()
-        self.conn = await websockets.connect(self.server_uri)
-        logger.info(f"Connected to server at {self.server_uri}")
-        
+        await self.connect()
         return self
-        
+
+    async def connect(self):
+        """
+        Open the connection, retrying with exponential backoff.
+
+        The connection is kept alive with pings and reused for every utterance
+        sent through this client.
+        """
+        delay = self.reconnect_delay
+        for attempt in range(self.max_reconnects + 1):
+            try:
+                self.conn = await websockets.connect(
+                    self.server_uri,
+                    # the server only parses frames if told so at the handshake
+                    additional_headers=(
+                        {FRAMING_HEADER: str(PROTOCOL_VERSION)} if self.framing else None
+                    ),
+                    compression=self.compression,
+                    ping_interval=self.keepalive,
+                    ping_timeout=self.keepalive,
+                )
+                logger.info(f"Connected to server at {self.server_uri}")
+                return
+            except (OSError, websockets.InvalidHandshake) as e:
+                if attempt == self.max_reconnects:
+                    raise
+                logger.warning(f"Could not connect ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def ensure_connected(self):
+        """
+        Reconnect if the connection was dropped.
+        """
+        if self.conn is None or self.conn.state is not State.OPEN:
+            await self.connect()
+
+    @property
+    def request_id(self) -> str:
+        """
+        ID of the current utterance, the stream UUID in its frame headers.
+        """
+        return self.stream_id.hex if self.stream_id is not None else None
+
+    async def send_utterance(
+        self, source, adaptive: bool = False, max_in_flight: int = 4
+    ) -> dict:
+        """
+        Send one utterance over the persistent connection and wait for its
+        result, reconnecting with backoff and resending if the connection drops.
+
+        Args:
+            source (bytes | os.PathLike): Audio to send. Adaptive streaming
+                needs a path to a WAV file.
+            adaptive (bool): Stream through the adaptive bitrate encoder.
+            max_in_flight (int): Maximum number of sent but unacknowledged chunks.
+
+        Returns:
+            dict: The server's final message for the utterance, None if the
+            server doesn't transcribe.
+        """
+        for attempt in range(self.max_reconnects + 1):
+            await self.ensure_connected()
+            try:
+                if adaptive:
+                    await self.stream_adaptive(source, max_in_flight)
+                else:
+                    await self.stream_chunks(source, max_in_flight)
+                return self.result
+            except websockets.ConnectionClosed as e:
+                if attempt == self.max_reconnects:
+                    raise
+                logger.warning(f"Connection dropped mid-utterance ({e}), resending")
+
+    async def submit(self, source, max_in_flight: int = 4) -> asyncio.Future:
+        """
+        Start sending an utterance without waiting for the previous ones to
+        finish. Any number of utterances can be in flight on the connection at
+        once; a single receiver task matches acks and results to them by
+        request ID.
+
+        Don't mix with the blocking `stream_*` methods while submitted
+        utterances are pending, since both read from the connection.
+
+        Args:
+            source (bytes | os.PathLike): Raw audio bytes or a path to an audio file.
+            max_in_flight (int): Maximum number of sent but unacknowledged
+                chunks of this utterance.
+
+        Returns:
+            asyncio.Future: Resolves to the server's final message for the
+            utterance once the server reports it done.
+        """
+        if not self.framing:
+            raise ValueError("Pipelined requests need framing")
+        await self.ensure_connected()
+        if self.receiver_task is None or self.receiver_task.done():
+            self.receiver_task = asyncio.create_task(self.receive())
+
+        utterance = PendingUtterance(max_in_flight)
+        self.pending[utterance.id] = utterance
+        sender = asyncio.create_task(self.send_request(utterance, source))
+        self.sender_tasks.add(sender)
+        sender.add_done_callback(self.sender_tasks.discard)
+        sender.add_done_callback(lambda task: self.on_request_sent(utterance, task))
+        return utterance.done
+
+    async def send_request(self, utterance: PendingUtterance, source):
+        """
+        Send the chunks of a submitted utterance, then end it.
+        """
+        codec = None
+        async for chunk in self.iter_chunks(source):
+            # fails instead of blocking if `receive` failed the utterance
+            await self.acquire_window(utterance.in_flight, utterance.done)
+            if codec is None:
+                codec = Codec.sniff(chunk)
+            utterance.timings.append(
+                {
+                    "index": len(utterance.timings),
+                    "bytes": len(chunk),
+                    "sent_at": time.perf_counter(),
+                    "acked_at": None,
+                }
+            )
+            await self.conn.send(
+                encode_frame(
+                    utterance.stream_id, len(utterance.timings) - 1, chunk, codec
+                )
+            )
+        await self.conn.send(json.dumps({"type": "end", "request_id": utterance.id}))
+
+    def on_request_sent(self, utterance: PendingUtterance, task: asyncio.Task):
+        """
+        Fail an utterance whose chunks could not all be sent.
+        """
+        if not task.cancelled() and task.exception() is not None:
+            self.fail(utterance, task.exception())
+
+    async def receive(self):
+        """
+        Route the server's messages to the submitted utterances they belong to
+        until the connection closes.
+        """
+        try:
+            while True:
+                msg = await self.conn.recv()
+                if not isinstance(msg, str):
+                    logger.error(f"Unexpected binary message ({len(msg)} bytes)")
+                elif msg.startswith("ack"):
+                    _, seq, *request_id = msg.split()
+                    utterance = self.pending.get(request_id[0] if request_id else None)
+                    if utterance is not None:
+                        utterance.ack(int(seq))
+                elif msg.startswith("{"):
+                    self.route(json.loads(msg))
+                else:
+                    logger.error(f"Unexpected message: {msg}")
+        except websockets.ConnectionClosed as e:
+            for utterance in list(self.pending.values()):
+                self.fail(utterance, e)
+
+    def route(self, message: dict):
+        utterance = self.pending.get(message.get("request_id"))
+        if utterance is None:
+            logger.warning(f"Message for an unknown request: {message}")
+            return
+
+        if message.get("type") == "partial":
+            utterance.partials.append(message)
+        elif message.get("type") in ("final", "error"):
+            utterance.result = message
+            if message["type"] == "error":
+                logger.error(f"Server could not transcribe: {message['error']}")
+        elif message.get("type") == "done":
+            del self.pending[utterance.id]
+            if not utterance.done.done():
+                utterance.done.set_result(utterance.result)
+            self.completed.put_nowait(utterance)
+
+    def fail(self, utterance: PendingUtterance, error: BaseException):
+        self.pending.pop(utterance.id, None)
+        if not utterance.done.done():
+            utterance.done.set_exception(error)
+        self.completed.put_nowait(utterance)
+
+    async def results(self):
+        """
+        Asynchronously yield submitted utterances in the order they finish,
+        until none are pending. Failed utterances are yielded too; their `done`
+        future holds the error.
+        """
+        while self.pending or not self.completed.empty():
+            yield await self.completed.get()
+
     async def __aexit__(self, exc_type, exc, tb):
+        self.close_encoders()
+        for task in self.sender_tasks:
+            task.cancel()
+        await asyncio.gather(*self.sender_tasks, return_exceptions=True)
+        if self.rtt_task is not None:
+            self.rtt_task.cancel()
+        if self.receiver_task is not None:
+            self.receiver_task.cancel()
         if self.conn:
             await self.conn.close()
 
     async def read_encoder_output(self):
         """
-        Read chunks from the encoder and put them into the queue.
+        Read chunks from the encoder and put them into the queue, tagged with
+        the bitrate they were encoded at.
         """
+        bitrate = int(self.encoding_params["b:a"])
         try:
             while True:
                 chunk = await self.encoder.stdout.read(self.chunk_size)
                 if not chunk:
                     break
-                await self.encoder_queue.put(chunk)
+                await self.encoder_queue.put((chunk, bitrate))
         except asyncio.CancelledError:
             pass
 
     async def restart_encoder(self):
         """
         Gracefully restart the encoder with updated parameters.
+
+        The running encoder is flushed rather than killed: everything already fed
+        to it still ends up in `encoder_queue`, and the new encoder continues from
+        the next PCM frame, so no audio is dropped or sent twice.
         """
         async with self.encoder_lock:
-            # Terminate existing encoder
+            old_bitrate = int(self.encoding_params["b:a"])
             if self.encoder:
-                self.encoder.terminate()
-                await self.encoder.wait()
-                self.encoder_task.cancel()
-                try:
-                    await self.encoder_task
-                except asyncio.CancelledError:
-                    pass
-
-            # Clear any stale chunks in the queue
-            while not self.encoder_queue.empty():
-                self.encoder_queue.get_nowait()
+                await self.finish_encoder()
 
             # Update bitrate and restart
             self.encoding_params["b:a"] = str(self.current_bitrate)
             await self.start_encoder()
+            self.switches.append(
+                (self.frames_fed / self.input_params["ar"], self.current_bitrate)
+            )
+
+        if self.ladder:
+            # respawn off the critical path; the next switch back is instant
+            task = asyncio.create_task(self.replace_warm_encoder(old_bitrate))
+            self.warm_tasks.add(task)
+            task.add_done_callback(self.warm_tasks.discard)
+
+    async def finish_encoder(self):
+        """
+        Close the encoder's input and wait until all of its output is queued.
+        Must be called with `encoder_lock` held.
+        """
+        self.encoder.stdin.close()
+        await self.encoder_task
+        await self.encoder.wait()
+
+    async def feed_encoder(self):
+        """
+        Feed PCM frames from the input file to the current encoder, then flush
+        the last encoder and mark the end of the stream with `None`.
+
+        Feeding is paced by `feed_credits`, so the encoders only ever run a few
+        blocks ahead of what has been sent and a bitrate switch applies to the
+        audio right after the current send position. Credits come back as the
+        encoded audio is sent, so they have to cover `ENCODER_DELAY` too: an
+        encoder that is starved of input holds back the output that would
+        return them.
+        """
+        with wave.open(str(self.original_file_path), "rb") as wav:
+            frame_size = wav.getsampwidth() * wav.getnchannels()
+            while True:
+                await self.feed_credits.acquire()
+                frames = await asyncio.to_thread(wav.readframes, self.chunk_size)
+                if not frames:
+                    break
+                # the lock keeps a bitrate switch from landing mid-write
+                async with self.encoder_lock:
+                    self.encoder.stdin.write(frames)
+                    await self.encoder.stdin.drain()
+                    self.frames_fed += len(frames) // frame_size
+
+        async with self.encoder_lock:
+            await self.finish_encoder()
+        await self.encoder_queue.put(None)
+
+    async def iter_encoder_output(self):
+        """
+        Asynchronously yield encoded chunks until the encoder input is exhausted.
+        """
+        block_seconds = self.chunk_size / self.input_params["ar"]
+        while True:
+            item = await self.encoder_queue.get()
+            if item is None:
+                return
+            chunk, bitrate = item
+            self.sent_bitrate = bitrate
+            yield chunk
+
+            # the chunk has been sent; hand back credits for fully sent blocks
+            self.seconds_sent += len(chunk) * 8 / bitrate
+            while (self.blocks_released + 1) * block_seconds <= self.seconds_sent:
+                self.blocks_released += 1
+                self.feed_credits.release()
 
     def update_profile(self, avg_rtt, measured_throughput):
         """
@@ -162,30 +571,342 @@ class VariableRateStreamerClient:
         end = time.perf_counter()
         return end - start
 
+    def probe_rtt(self):
+        """
+        Start measuring the RTT in the background, unless a ping is already in
+        flight. The result is appended to `rtts` once the pong arrives, even if
+        the stream has ended by then.
+        """
+        if self.rtt_task is None or self.rtt_task.done():
+            self.rtt_task = asyncio.create_task(self.record_rtt())
+
+    async def record_rtt(self):
+        try:
+            self.rtts.append(await self.measure_rtt(self.conn))
+        except websockets.ConnectionClosed:
+            pass
+
     async def stream_file(self, bytes):
         """
         Stream MP3-encoded data in byte-sized chunks.
         """
+        self.partials = []
+        self.result = None
+
         # for now, just send the entire file
         print(f"Sending {len(bytes)} bytes at {time.time()}")
-        await self.conn.send(bytes)
+        self.stream_id = uuid.uuid4()
+        await self.conn.send(self.frame(0, bytes, Codec.sniff(bytes), 0))
         print(f"Sent {len(bytes)} bytes at {time.time()}")
-        await self.conn.send("done")
+        await self.conn.send(self.end_message())
         print(f"Sent done message at {time.time()}")
         
-        # wait for done message from server
-        msg = await self.conn.recv()
-        print(f"Received message from server at {time.time()}: {msg}")
-        logger.info(f"Received message from server: {msg}")
-        if isinstance(msg, str):
-            if msg == "done":
+        # wait for done message from server, skipping chunk acknowledgements
+        while True:
+            msg = await self.conn.recv()
+            if isinstance(msg, str) and msg.startswith("ack"):
+                continue
+            if isinstance(msg, str) and self.handle_transcript(msg):
+                continue
+            print(f"Received message from server at {time.time()}: {msg}")
+            logger.info(f"Received message from server: {msg}")
+            if isinstance(msg, str):
+                if self.is_done(msg):
+                    logger.info("Server finished processing.")
+                    break
+                else:
+                    logger.error(f"Unexpected message: {msg}")
+
+    async def iter_chunks(self, source):
+        """
+        Asynchronously yield the input in chunks of `chunk_size` bytes.
+
+        Args:
+            source (bytes | os.PathLike): Raw audio bytes or a path to an audio file.
+        """
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            view = memoryview(source)
+            for offset in range(0, len(view), self.chunk_size):
+                yield bytes(view[offset : offset + self.chunk_size])
+                # let the ack reader run between chunks
+                await asyncio.sleep(0)
+            return
+
+        with open(source, "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    async def stream_chunks(self, source, max_in_flight: int = 4) -> list:
+        """
+        Stream the input chunk by chunk, keeping at most `max_in_flight` chunks
+        unacknowledged by the server at any time.
+
+        Args:
+            source (bytes | os.PathLike): Raw audio bytes or a path to an audio file.
+            max_in_flight (int): Maximum number of sent but unacknowledged chunks.
+
+        Returns:
+            list: One dict per chunk with its index, size, send time and ack time
+            (seconds, from `time.perf_counter`).
+        """
+        self.codec = None
+        self.sent_bitrate = 0
+        return await self.send_chunks(self.iter_chunks(source), max_in_flight)
+
+    async def stream_adaptive(
+        self, file_path, max_in_flight: int = 4, lookahead: int = 4
+    ) -> list:
+        """
+        Stream a WAV file through the ffmpeg encoder, re-measuring RTT and
+        throughput every `adaptation_interval` chunks and switching bitrate
+        mid-stream when `update_profile` asks for it.
+
+        Args:
+            file_path (os.PathLike): Path to the WAV file to stream.
+            max_in_flight (int): Maximum number of sent but unacknowledged chunks.
+            lookahead (int): Number of `chunk_size`-frame PCM blocks the encoder
+                may run ahead of the audio already sent, on top of the blocks
+                covering `ENCODER_DELAY`.
+
+        Returns:
+            list: Per-chunk timings, as returned by `stream_chunks`.
+        """
+        self.original_file_path = Path(file_path)
+        with wave.open(str(self.original_file_path), "rb") as wav:
+            self.input_params = {
+                "ar": wav.getframerate(),
+                "ac": wav.getnchannels(),
+                "sample_width": wav.getsampwidth(),
+            }
+
+        self.chunk_count = 0
+        self.window_start = time.perf_counter()
+        self.window_bytes = 0
+        self.frames_fed = 0
+        self.switches = []
+        block_seconds = self.chunk_size / self.input_params["ar"]
+        self.feed_credits = asyncio.Semaphore(
+            lookahead + math.ceil(ENCODER_DELAY / block_seconds)
+        )
+        self.blocks_released = 0
+        self.seconds_sent = 0.0
+
+        self.encoding_params["b:a"] = str(self.current_bitrate)
+        self.codec = Codec.MP3
+        if self.ladder:
+            await self.warm_up_encoders()
+        await self.start_encoder()
+        feeder = asyncio.create_task(self.feed_encoder())
+        try:
+            timings = await self.send_chunks(
+                self.iter_encoder_output(), max_in_flight, on_sent=self.adapt
+            )
+            await feeder
+        finally:
+            feeder.cancel()
+            # only left running if the stream was interrupted
+            if self.encoder is not None and self.encoder.returncode is None:
+                self.encoder.kill()
+
+        return timings
+
+    async def adapt(self, chunk: bytes):
+        """
+        Account for a sent chunk and, every `adaptation_interval` chunks, measure
+        the link and switch the encoder bitrate if the profile changed.
+
+        The RTT is pinged in the background rather than awaited here, so a slow
+        link doesn't stall sending for a round trip and skew the throughput of
+        the next window; each decision uses the RTTs measured so far.
+        """
+        self.chunk_count += 1
+        self.window_bytes += len(chunk)
+        if self.chunk_count % self.adaptation_interval != 0:
+            return
+
+        self.probe_rtt()
+        # no RTT-based adaptation until the first pong is back
+        rtt = statistics.mean(self.rtts[-3:]) if self.rtts else 0.0
+        throughput = self.window_bytes * 8 / (time.perf_counter() - self.window_start)
+        self.throughputs.append(throughput)
+
+        self.update_profile(rtt, throughput)
+        if self.pending_bitrate_change:
+            logger.info(
+                f"Switching to {self.current_bitrate} bps "
+                f"(rtt {rtt * 1000:.1f}ms, throughput {throughput:.0f} bps)"
+            )
+            await self.restart_encoder()
+            self.pending_bitrate_change = False
+
+        self.window_start = time.perf_counter()
+        self.window_bytes = 0
+
+    async def send_chunks(self, chunks, max_in_flight: int, on_sent=None) -> list:
+        """
+        Send chunks from an async iterator with bounded in-flight backpressure,
+        then send "done" and wait for the server to finish.
+
+        Args:
+            chunks: Async iterator of bytes to send.
+            max_in_flight (int): Maximum number of sent but unacknowledged chunks.
+            on_sent: Optional coroutine function called with each chunk once sent.
+        """
+        in_flight = asyncio.Semaphore(max_in_flight)
+        timings = []
+        self.partials = []
+        self.result = None
+        self.stream_id = uuid.uuid4()
+        ack_task = asyncio.create_task(self.read_acks(timings, in_flight))
+
+        try:
+            async for chunk in chunks:
+                await self.acquire_window(in_flight, ack_task)
+                timings.append(
+                    {
+                        "index": len(timings),
+                        "bytes": len(chunk),
+                        "sent_at": time.perf_counter(),
+                        "acked_at": None,
+                    }
+                )
+                if self.codec is None:
+                    self.codec = Codec.sniff(chunk)
+                await self.conn.send(
+                    self.frame(len(timings) - 1, chunk, self.codec, self.sent_bitrate)
+                )
+                if on_sent is not None:
+                    await on_sent(chunk)
+
+            await self.conn.send(self.end_message())
+            await ack_task
+        finally:
+            ack_task.cancel()
+
+        self.chunk_timings = timings
+        if timings:
+            ack_latencies = [t["acked_at"] - t["sent_at"] for t in timings]
+            logger.info(
+                f"Streamed {len(timings)} chunks, "
+                f"first ack after {ack_latencies[0] * 1000:.1f}ms, "
+                f"mean ack latency {statistics.mean(ack_latencies) * 1000:.1f}ms"
+            )
+        return timings
+
+    async def acquire_window(self, in_flight: asyncio.Semaphore, receiver):
+        """
+        Wait for room in the send window, unless `receiver`, the future reading
+        the server's replies, finishes first: then no ack will ever free the
+        window, so its error (e.g. `ConnectionClosed`) is raised instead.
+        """
+        acquire = asyncio.ensure_future(in_flight.acquire())
+        await asyncio.wait({acquire, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        if acquire.done():
+            return
+        acquire.cancel()
+        if not receiver.cancelled() and receiver.exception() is not None:
+            raise receiver.exception()
+        raise ConnectionError("Server stopped acknowledging before the stream ended")
+
+    async def read_acks(self, timings: list, in_flight: asyncio.Semaphore):
+        """
+        Record chunk acknowledgements from the server until it reports it is done.
+        """
+        while True:
+            msg = await self.conn.recv()
+            if not isinstance(msg, str):
+                logger.error(f"Unexpected binary message ({len(msg)} bytes)")
+            elif msg.startswith("ack"):
+                idx = int(msg.split()[1])
+                timings[idx]["acked_at"] = time.perf_counter()
+                in_flight.release()
+            elif self.is_done(msg):
                 logger.info("Server finished processing.")
+                break
+            elif self.handle_transcript(msg):
+                continue
             else:
                 logger.error(f"Unexpected message: {msg}")
 
+    def end_message(self) -> str:
+        """
+        Message ending the current utterance. Framed utterances are ended by
+        request ID and keep the connection open for the next one; legacy
+        streams end with "done".
+        """
+        if not self.framing:
+            return "done"
+        return json.dumps({"type": "end", "request_id": self.request_id})
+
+    def is_done(self, msg: str) -> bool:
+        """
+        Whether a message reports the server finished the current utterance.
+        """
+        if msg == "done":
+            return True
+        if not msg.startswith("{"):
+            return False
+        try:
+            message = json.loads(msg)
+        except json.JSONDecodeError:
+            return False
+        return (
+            message.get("type") == "done"
+            and message.get("request_id") == self.request_id
+        )
+
+    def frame(self, seq: int, chunk: bytes, codec: Codec, bitrate: int) -> bytes:
+        """
+        Wrap a chunk in a frame header of the current stream, unless framing is
+        disabled for servers that only understand raw chunks.
+        """
+        if not self.framing:
+            return chunk
+        return encode_frame(self.stream_id, seq, chunk, codec, bitrate)
+
+    def handle_transcript(self, msg: str) -> bool:
+        """
+        Record a partial or final transcript message from the server.
+
+        Returns:
+            bool: Whether the message was a transcript.
+        """
+        if not msg.startswith("{"):
+            return False
+        try:
+            transcript = json.loads(msg)
+        except json.JSONDecodeError:
+            return False
+        request_id = transcript.get("request_id", self.request_id)
+        if self.framing and request_id != self.request_id:
+            logger.debug(f"Dropping message of an earlier utterance: {msg}")
+            return True
+
+        if transcript.get("type") == "partial":
+            self.partials.append(transcript)
+            logger.debug(f"Partial transcript: {transcript['text']}")
+        elif transcript.get("type") == "final":
+            self.result = transcript
+            logger.info(
+                f"Final transcript: {transcript['text']} "
+                f"(intent {transcript['intent']}, score {transcript['score']})"
+            )
+        elif transcript.get("type") == "error":
+            self.result = transcript
+            logger.error(f"Server could not transcribe: {transcript['error']}")
+        else:
+            return False
+        return True
+
     def __del__(self):
         if self.encoder and self.encoder.returncode is None:
             self.encoder.kill()
+        for encoder in self.warm_encoders.values():
+            if encoder.returncode is None:
+                encoder.kill()
 
 
 if __name__ == "__main__":
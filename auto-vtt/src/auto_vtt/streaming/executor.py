@@ -0,0 +1,124 @@
+import asyncio
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+
+class ExecutorBusy(Exception):
+    """
+    Raised when the executor's queue, or a client's share of it, is full.
+    """
+
+
+class InferenceExecutor:
+    """
+    Runs blocking inference calls (transcription, classification) on a bounded
+    thread pool, so they never block the server's event loop.
+
+    Waiting calls are queued per client and dispatched round robin, so a client
+    with many queued calls can't hold back the others. Calls beyond the queue
+    limits are rejected with `ExecutorBusy` instead of piling up.
+
+    Threads rather than processes are used because the models are too large to
+    copy into every worker and PyTorch releases the GIL while it computes.
+    Calls on the same whisper model still run one at a time, as
+    `SpeechToTextConverter` holds the model's lock; extra workers let
+    classification and other models run alongside.
+    """
+
+    def __init__(
+        self, max_workers: int = 2, max_queued: int = 32, max_queued_per_client: int = 4
+    ):
+        """
+        :param max_workers: Calls run at the same time, across all models.
+        :param max_queued: Calls waiting for a worker, over all clients.
+        :param max_queued_per_client: Calls waiting for a worker, per client.
+        """
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_queued_per_client = max_queued_per_client
+        self.pool = ThreadPoolExecutor(max_workers, thread_name_prefix="inference")
+
+        self.queues = OrderedDict()  # client id -> deque of (fn, args, future)
+        self.queued = 0
+        self.running = 0
+        self.rejected = 0
+
+    def submit(self, client_id, fn, *args) -> asyncio.Future:
+        """
+        Queue `fn(*args)` on behalf of a client.
+
+        :raises ExecutorBusy: If the call can't be queued.
+        :return: A future resolving to the call's result.
+        """
+        queue = self.queues.get(client_id)
+        if self.queued >= self.max_queued or (
+            queue is not None and len(queue) >= self.max_queued_per_client
+        ):
+            self.rejected += 1
+            raise ExecutorBusy(
+                f"{self.queued} calls queued, {0 if queue is None else len(queue)} "
+                f"for client {client_id}"
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        if queue is None:
+            queue = self.queues[client_id] = deque()
+        queue.append((fn, args, future))
+        self.queued += 1
+        self.dispatch()
+        return future
+
+    async def run(self, client_id, fn, *args):
+        """
+        Run `fn(*args)` on behalf of a client and return its result.
+
+        :raises ExecutorBusy: If the call can't be queued.
+        """
+        return await self.submit(client_id, fn, *args)
+
+    def dispatch(self):
+        """
+        Start queued calls while workers are free, taking one call from each
+        client in turn.
+        """
+        loop = asyncio.get_running_loop()
+        while self.running < self.max_workers and self.queues:
+            client_id, queue = next(iter(self.queues.items()))
+            fn, args, future = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self.queues.move_to_end(client_id)
+            else:
+                del self.queues[client_id]
+            if future.cancelled():
+                continue
+
+            self.running += 1
+            call = loop.run_in_executor(self.pool, fn, *args)
+            call.add_done_callback(lambda call, future=future: self.on_done(call, future))
+
+    def on_done(self, call: asyncio.Future, future: asyncio.Future):
+        self.running -= 1
+        if not future.cancelled():
+            if call.exception() is not None:
+                future.set_exception(call.exception())
+            else:
+                future.set_result(call.result())
+        self.dispatch()
+
+    def cancel(self, client_id):
+        """
+        Drop the calls a client still has queued, e.g. when it disconnected.
+        """
+        queue = self.queues.pop(client_id, None)
+        if queue is None:
+            return
+        self.queued -= len(queue)
+        for _, _, future in queue:
+            future.cancel()
+        logger.debug(f"Dropped {len(queue)} queued calls of client {client_id}")
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
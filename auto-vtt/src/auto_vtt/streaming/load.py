@@ -0,0 +1,160 @@
+import asyncio
+import statistics
+import time
+import wave
+from pathlib import Path
+
+import fire
+import websockets
+from loguru import logger
+
+from .client import VariableRateStreamerClient
+
+
+async def paced_chunks(data: bytes, chunk_size: int, bytes_per_second: float):
+    """
+    Yield `data` in chunks no faster than `bytes_per_second`, like a car
+    streaming audio as it is recorded.
+    """
+    start = time.perf_counter()
+    for offset in range(0, len(data), chunk_size):
+        due = start + offset / bytes_per_second
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        yield data[offset : offset + chunk_size]
+
+
+async def run_stream(
+    server_uri: str,
+    data: bytes,
+    chunk_size: int,
+    max_in_flight: int,
+    bytes_per_second: float = None,
+    utterances: int = 1,
+) -> dict:
+    """
+    Stream `data` over one connection and report how it went. With several
+    utterances, all of them are submitted at once and pipelined.
+    """
+    client = VariableRateStreamerClient(server_uri, chunk_size=chunk_size)
+    start = time.perf_counter()
+    try:
+        async with client:
+            if utterances > 1:
+                return await run_pipelined(client, data, max_in_flight, utterances)
+            if bytes_per_second:
+                chunks = paced_chunks(data, chunk_size, bytes_per_second)
+                timings = await client.send_chunks(chunks, max_in_flight)
+            else:
+                timings = await client.stream_chunks(data, max_in_flight)
+    except (websockets.ConnectionClosed, OSError) as e:
+        return {"ok": False, "error": str(e), "duration": time.perf_counter() - start}
+
+    return {
+        "ok": True,
+        "duration": time.perf_counter() - start,
+        "bytes": sum(t["bytes"] for t in timings),
+        "ack_latency": statistics.mean(t["acked_at"] - t["sent_at"] for t in timings),
+        "result": client.result,
+    }
+
+
+async def run_pipelined(
+    client: VariableRateStreamerClient,
+    data: bytes,
+    max_in_flight: int,
+    utterances: int,
+) -> dict:
+    start = time.perf_counter()
+    for _ in range(utterances):
+        await client.submit(data, max_in_flight)
+
+    timings = []
+    results = []
+    async for utterance in client.results():
+        if utterance.done.exception() is not None:
+            raise utterance.done.exception()
+        timings.extend(utterance.timings)
+        results.append(utterance.result)
+
+    return {
+        "ok": True,
+        "duration": time.perf_counter() - start,
+        "bytes": sum(t["bytes"] for t in timings),
+        "ack_latency": statistics.mean(t["acked_at"] - t["sent_at"] for t in timings),
+        "result": results,
+    }
+
+
+async def generate_load(
+    server_uri: str,
+    file_path: str,
+    clients: int = 100,
+    ramp_seconds: float = 1.0,
+    chunk_size: int = 4096,
+    max_in_flight: int = 4,
+    realtime: bool = False,
+    utterances: int = 1,
+) -> dict:
+    """
+    Stream a file from many simultaneous clients to a server.
+
+    Args:
+        server_uri (str): WebSocket URI of the server.
+        file_path (str): Audio file every client streams.
+        clients (int): Number of simultaneous clients.
+        ramp_seconds (float): Clients connect evenly spread over this many seconds.
+        chunk_size (int): Bytes per chunk.
+        max_in_flight (int): Unacknowledged chunks allowed per client.
+        realtime (bool): Pace WAV files at their playback rate instead of
+            sending as fast as the link allows. Applies to single utterances.
+        utterances (int): Utterances each client pipelines over its connection.
+
+    Returns:
+        dict: Numbers of completed and failed streams, stream duration
+        percentiles, mean ack latency and aggregate throughput.
+    """
+    data = Path(file_path).read_bytes()
+    bytes_per_second = None
+    if realtime:
+        with wave.open(str(file_path), "rb") as wav:
+            bytes_per_second = (
+                wav.getframerate() * wav.getnchannels() * wav.getsampwidth()
+            )
+
+    async def delayed_stream(i):
+        await asyncio.sleep(ramp_seconds * i / clients)
+        return await run_stream(
+            server_uri, data, chunk_size, max_in_flight, bytes_per_second, utterances
+        )
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(delayed_stream(i) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    completed = [r for r in results if r["ok"]]
+    durations = sorted(r["duration"] for r in completed)
+    summary = {
+        "clients": clients,
+        "completed": len(completed),
+        "failed": clients - len(completed),
+        "elapsed": elapsed,
+        "utterances": clients * utterances,
+        "throughput_bps": sum(r["bytes"] for r in completed) * 8 / elapsed,
+    }
+    if len(durations) >= 2:
+        quantiles = statistics.quantiles(durations, n=20)
+        summary["duration_p50"] = statistics.median(durations)
+        summary["duration_p95"] = quantiles[18]
+        summary["ack_latency_mean"] = statistics.mean(
+            r["ack_latency"] for r in completed
+        )
+
+    logger.info(
+        f"{summary['completed']}/{clients} streams completed in {elapsed:.1f}s, "
+        f"{summary['throughput_bps'] / 1e6:.2f} Mbps aggregate"
+    )
+    return summary
+
+
+if __name__ == "__main__":
+    fire.Fire(generate_load)
@@ -0,0 +1,85 @@
+import time
+
+from loguru import logger
+
+
+class ServerMetrics:
+    """
+    Counters of a `VariableRateStreamerServer`, with rates computed between
+    consecutive snapshots.
+    """
+
+    def __init__(self):
+        self.sessions_accepted = 0
+        self.sessions_rejected = 0
+        self.sessions_finished = 0
+        self.active_sessions = 0
+        self.peak_sessions = 0
+        self.chunks_received = 0
+        self.bytes_received = 0
+
+        self.last_snapshot_at = time.perf_counter()
+        self.last_snapshot_bytes = 0
+        self.last_snapshot_chunks = 0
+
+    def session_opened(self):
+        self.sessions_accepted += 1
+        self.active_sessions += 1
+        self.peak_sessions = max(self.peak_sessions, self.active_sessions)
+
+    def session_closed(self, finished: bool):
+        self.active_sessions -= 1
+        if finished:
+            self.sessions_finished += 1
+
+    def session_rejected(self):
+        self.sessions_rejected += 1
+
+    def chunk_received(self, size: int):
+        self.chunks_received += 1
+        self.bytes_received += size
+
+    def snapshot(self, executor=None) -> dict:
+        """
+        Current counters, plus the receive rates since the previous snapshot
+        and, if given, the queue depth of the inference executor.
+        """
+        now = time.perf_counter()
+        elapsed = max(now - self.last_snapshot_at, 1e-9)
+        snapshot = {
+            "active_sessions": self.active_sessions,
+            "peak_sessions": self.peak_sessions,
+            "sessions_accepted": self.sessions_accepted,
+            "sessions_rejected": self.sessions_rejected,
+            "sessions_finished": self.sessions_finished,
+            "bytes_received": self.bytes_received,
+            "bytes_per_second": (self.bytes_received - self.last_snapshot_bytes)
+            / elapsed,
+            "chunks_per_second": (self.chunks_received - self.last_snapshot_chunks)
+            / elapsed,
+        }
+        if executor is not None:
+            snapshot["queued"] = executor.queued
+            snapshot["running"] = executor.running
+            snapshot["inference_rejected"] = executor.rejected
+
+        self.last_snapshot_at = now
+        self.last_snapshot_bytes = self.bytes_received
+        self.last_snapshot_chunks = self.chunks_received
+        return snapshot
+
+    def log(self, executor=None):
+        snapshot = self.snapshot(executor)
+        logger.info(
+            f"{snapshot['active_sessions']} active sessions "
+            f"({snapshot['sessions_accepted']} accepted, "
+            f"{snapshot['sessions_rejected']} rejected), "
+            f"{snapshot['bytes_per_second'] / 1000:.1f} kB/s, "
+            f"{snapshot['chunks_per_second']:.1f} chunks/s"
+            + (
+                f", {snapshot['queued']} queued and {snapshot['running']} running "
+                f"inference calls"
+                if executor is not None
+                else ""
+            )
+        )
@@ -0,0 +1,159 @@
+"""
+Binary framing of the audio messages sent from `VariableRateStreamerClient` to
+`VariableRateStreamerServer`.
+
+Every binary WebSocket message starts with a fixed 36 byte header, in network
+byte order:
+
+    magic       2s   b"AV"
+    version     B    PROTOCOL_VERSION
+    codec       B    `Codec` of the payload
+    session     16s  UUID of the stream
+    seq         I    index of the frame in the stream, from 0
+    captured_at d    Unix time the payload was captured or encoded
+    bitrate     I    bits per second the payload was encoded at, 0 if unknown
+
+followed by the payload.
+
+Whether a connection carries frames is decided once, at the handshake: framing
+clients send the `FRAMING_HEADER` header with the protocol version. Every
+binary message of a connection without it is a legacy raw chunk, whatever its
+first bytes are.
+"""
+
+import enum
+import struct
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+MAGIC = b"AV"
+PROTOCOL_VERSION = 1
+HEADER = struct.Struct("!2sBB16sIdI")
+FRAMING_HEADER = "X-AV-Framing"
+
+
+class Codec(enum.IntEnum):
+    UNKNOWN = 0
+    WAV = 1
+    MP3 = 2
+
+    @property
+    def ffmpeg_format(self) -> Optional[str]:
+        """
+        ffmpeg demuxer of the codec, None to let ffmpeg probe the input.
+        """
+        return {Codec.WAV: "wav", Codec.MP3: "mp3"}.get(self)
+
+    @property
+    def extension(self) -> str:
+        return {Codec.WAV: ".wav", Codec.MP3: ".mp3"}.get(self, ".bin")
+
+    @classmethod
+    def sniff(cls, data: bytes) -> "Codec":
+        """
+        Guess the codec of the start of a stream from its magic bytes.
+        """
+        if data[:4] == b"RIFF":
+            return cls.WAV
+        if data[:3] == b"ID3" or (len(data) > 1 and data[0] == 0xFF and data[1] & 0xE0 == 0xE0):
+            return cls.MP3
+        return cls.UNKNOWN
+
+
+@dataclass
+class Frame:
+    session: uuid.UUID
+    seq: int
+    captured_at: float
+    codec: Codec
+    bitrate: int
+    payload: memoryview
+
+
+def encode_frame(
+    session: uuid.UUID,
+    seq: int,
+    payload: bytes,
+    codec: Codec = Codec.UNKNOWN,
+    bitrate: int = 0,
+    captured_at: Optional[float] = None,
+) -> bytes:
+    """
+    Prefix a payload with a frame header.
+    """
+    if captured_at is None:
+        captured_at = time.time()
+    header = HEADER.pack(
+        MAGIC, PROTOCOL_VERSION, codec, session.bytes, seq, captured_at, bitrate
+    )
+    return header + payload
+
+
+def decode_frame(message: bytes) -> Optional[Frame]:
+    """
+    Parse a frame without copying its payload.
+
+    :raises ValueError: If the message is a frame of an unsupported version.
+    :return: The frame, or None if the message is not a frame.
+    """
+    view = memoryview(message)
+    if len(view) < HEADER.size or view[: len(MAGIC)] != MAGIC:
+        return None
+
+    _, version, codec, session, seq, captured_at, bitrate = HEADER.unpack_from(view)
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported protocol version {version}")
+    try:
+        codec = Codec(codec)
+    except ValueError:
+        codec = Codec.UNKNOWN
+    return Frame(
+        uuid.UUID(bytes=bytes(session)),
+        seq,
+        captured_at,
+        codec,
+        bitrate,
+        view[HEADER.size :],
+    )
+
+
+class Reassembler:
+    """
+    Puts the frames of a stream back in sequence order.
+
+    Frames arriving ahead of a missing one are held until it arrives. If more
+    than `max_pending` frames are held, the gap is given up on and the held
+    frames are released. Duplicates are dropped.
+    """
+
+    def __init__(self, max_pending: int = 64):
+        self.max_pending = max_pending
+        self.next_seq = 0
+        self.pending = {}  # seq -> frame
+        self.out_of_order = 0
+        self.duplicates = 0
+        self.lost = 0
+
+    def push(self, frame: Frame) -> list:
+        """
+        :return: Frames that are now in order, possibly none.
+        """
+        if frame.seq < self.next_seq or frame.seq in self.pending:
+            self.duplicates += 1
+            return []
+        if frame.seq != self.next_seq:
+            self.out_of_order += 1
+        self.pending[frame.seq] = frame
+
+        if len(self.pending) > self.max_pending:
+            first = min(self.pending)
+            self.lost += first - self.next_seq
+            self.next_seq = first
+
+        ready = []
+        while self.next_seq in self.pending:
+            ready.append(self.pending.pop(self.next_seq))
+            self.next_seq += 1
+        return ready
@@ -4,22 +4,205 @@ import websockets
 from pathlib import Path
 import os
 import json
+import statistics
+import time
+import uuid
 from datetime import datetime
 import fire
 from asyncio import Event
 
+from .buffer import ReceiveBuffer
+from .executor import ExecutorBusy, InferenceExecutor
+from .metrics import ServerMetrics
+from .protocol import (
+    FRAMING_HEADER,
+    PROTOCOL_VERSION,
+    Codec,
+    Frame,
+    Reassembler,
+    decode_frame,
+)
+from .transcription import TranscriptionSession
+
+
+class StreamRequest:
+    """
+    State of one utterance streamed within a client session. Its audio is kept
+    in its own `ReceiveBuffer`, and anything written to disk goes to its own
+    directory, so concurrent streams never overwrite each other's files.
+    """
+
+    def __init__(
+        self, request_id: str, session_dir: Path, buffer_size: int, spill: bool
+    ):
+        self.id = request_id
+        self.dir = session_dir / request_id
+        self.buffer = ReceiveBuffer(
+            buffer_size, spill_path=self.dir / "spill.bin" if spill else None
+        )
+        self.chunk_idx = 0  # binary messages received
+        self.reassembler = Reassembler()
+        self.codec = None  # codec of the stream, from its first frame
+        self.latencies = []  # one-way latency of each frame, in seconds
+        self.transcription = None
+
+    @property
+    def bytes_received(self) -> int:
+        return self.buffer.total
+
+    def stream_stats(self) -> dict:
+        return {
+            "codec": self.codec.name if self.codec is not None else None,
+            "frames": self.chunk_idx,
+            "out_of_order": self.reassembler.out_of_order,
+            "lost": self.reassembler.lost,
+            "one_way_latency": (
+                statistics.mean(self.latencies) if self.latencies else None
+            ),
+        }
+
+    def close(self):
+        if self.transcription is not None:
+            self.transcription.close()
+        self.buffer.close()
+
+
+class ClientSession:
+    """
+    State of one client connection, which may stream many utterances. Framed
+    utterances are told apart by the stream UUID in their headers; legacy raw
+    chunks all belong to one request named after the session.
+    """
+
+    def __init__(
+        self, output_dir: Path, buffer_size: int, spill: bool, framed: bool = True
+    ):
+        """
+        :param framed: Whether the client negotiated framing at the handshake.
+            Binary messages of unframed sessions are never parsed as frames.
+        """
+        self.id = uuid.uuid4().hex
+        self.framed = framed
+        self.dir = output_dir / self.id
+        self.buffer_size = buffer_size
+        self.spill = spill
+        self.requests = {}  # request id -> StreamRequest
+        self.requests_finished = 0
+        self.finishing = set()  # tasks finishing ended requests
+
+    @property
+    def finished(self) -> bool:
+        return self.requests_finished > 0
+
+    def request(self, request_id: str) -> StreamRequest:
+        """
+        The state of a request, created on its first frame.
+        """
+        if request_id not in self.requests:
+            self.requests[request_id] = StreamRequest(
+                request_id, self.dir, self.buffer_size, self.spill
+            )
+        return self.requests[request_id]
+
+    def read_frames(self, message: bytes) -> tuple:
+        """
+        Parse a binary message into a frame and reassemble it within its request.
+
+        Legacy raw chunks are wrapped in a frame numbered by arrival, with the
+        codec guessed from the stream's first bytes.
+
+        :raises ValueError: If a framed session sent anything but a frame of
+            the supported version.
+        :return: The request, the sequence number to acknowledge and the
+            request's frames now in order.
+        """
+        if self.framed:
+            frame = decode_frame(message)
+            if frame is None:
+                raise ValueError(f"Expected a frame, got {len(message)} raw bytes")
+            request = self.request(frame.session.hex)
+            request.latencies.append(time.time() - frame.captured_at)
+        else:
+            request = self.request(self.id)
+            frame = Frame(
+                uuid.UUID(self.id),
+                request.chunk_idx,
+                time.time(),
+                request.codec or Codec.sniff(message),
+                0,
+                memoryview(message),
+            )
+        request.chunk_idx += 1
+        return request, frame.seq, request.reassembler.push(frame)
+
+    def close(self):
+        for request in self.requests.values():
+            request.close()
+        self.requests.clear()
+
+
 class VariableRateStreamerServer:
-    def __init__(self, output_dir: Path, on_transmission_finished: callable, host="0.0.0.0", port=8765,):
+    def __init__(
+        self,
+        output_dir: Path,
+        on_transmission_finished: callable,
+        host="0.0.0.0",
+        port=8765,
+        converter=None,
+        classifier=None,
+        partial_interval: float = 1.0,
+        executor: InferenceExecutor = None,
+        max_sessions: int = None,
+        metrics_interval: float = 10.0,
+        buffer_size: int = 1 << 20,
+        spill: bool = True,
+        archive: bool = False,
+        compression: str = "deflate",
+    ):
         """
         :param output_dir: Directory where received chunks will be saved.
         :param host: Hostname to bind the server.
         :param port: Port to bind the server.
+        :param converter: Optional `SpeechToTextConverter`. When set, received
+            audio is transcribed while it streams in, and partial and final
+            transcripts are sent back as JSON messages tagged with the request
+            ID before it is reported done.
+        :param classifier: Optional callable mapping the final transcript to an
+            intent (label, score), e.g. an `ActionClassifier`.
+        :param partial_interval: Seconds of new audio between partial transcripts.
+        :param executor: Pool the model calls of all connections share. Defaults
+            to a new `InferenceExecutor` when `converter` is set.
+        :param max_sessions: Connections served at once; further ones are closed
+            with "try again later" (1013). Unlimited if None.
+        :param metrics_interval: Seconds between metrics log lines, 0 to disable.
+        :param buffer_size: Most bytes of received audio kept in memory per
+            stream. Buffers grow to it as audio arrives rather than up front.
+        :param spill: Move audio that outgrows the buffer to a file in the
+            session's directory instead of dropping it.
+        :param archive: Save each finished stream to `stream.<codec>` in its
+            request's directory.
+        :param compression: WebSocket compression offered to clients, None to
+            disable. Compressed audio rarely gets smaller, so disabling it saves
+            CPU on both ends.
         """
         output_dir = Path(output_dir)
         self.output_dir = output_dir
         self.on_transmission_finished = on_transmission_finished
         self.host = host
         self.port = port
+        self.converter = converter
+        self.classifier = classifier
+        self.partial_interval = partial_interval
+        self.executor = executor
+        if self.executor is None and converter is not None:
+            self.executor = InferenceExecutor()
+        self.max_sessions = max_sessions
+        self.metrics_interval = metrics_interval
+        self.metrics = ServerMetrics()
+        self.buffer_size = buffer_size
+        self.spill = spill
+        self.archive = archive
+        self.compression = compression
         
         os.makedirs(output_dir, exist_ok=True)
         
@@ -27,11 +210,143 @@ class VariableRateStreamerServer:
     async def on_done_processing(self, client_websocket):
         await client_websocket.send("done")
 
+    def create_transcription(
+        self, websocket, session: ClientSession, request: StreamRequest
+    ) -> TranscriptionSession:
+        async def send_partial(text, audio_seconds):
+            await websocket.send(
+                json.dumps(
+                    {
+                        "type": "partial",
+                        "request_id": request.id,
+                        "text": text,
+                        "audio": audio_seconds,
+                    }
+                )
+            )
+
+        return TranscriptionSession(
+            self.converter,
+            self.classifier,
+            on_partial=send_partial,
+            partial_interval=self.partial_interval,
+            executor=self.executor,
+            client_id=session.id,
+        )
+
+    async def send_final(self, websocket, request: StreamRequest):
+        """
+        Finish transcribing a request's stream and send the final transcript,
+        intent and stage timings to the client.
+        """
+        if request.transcription is None:
+            result = {"text": "", "intent": None, "score": None, "audio": 0.0}
+        else:
+            try:
+                result = await request.transcription.finish()
+            except ExecutorBusy as e:
+                logger.warning(f"Rejected transcription: {e}")
+                await websocket.send(
+                    json.dumps(
+                        {"type": "error", "request_id": request.id, "error": "busy"}
+                    )
+                )
+                return
+        result["stream"] = request.stream_stats()
+        await websocket.send(
+            json.dumps({"type": "final", "request_id": request.id, **result})
+        )
+
+    async def finish_request(self, websocket, session: ClientSession, request_id: str):
+        """
+        Complete a request once the client ended it: send its result, archive
+        its stream if asked to and release its state.
+        """
+        request = session.requests.pop(request_id, None)
+        if request is None:
+            # ended without sending any audio
+            request = StreamRequest(
+                request_id, session.dir, self.buffer_size, spill=False
+            )
+        logger.info(
+            f"Client finished streaming {request.bytes_received} bytes "
+            f"(session {session.id}, request {request.id})."
+        )
+        try:
+            if self.converter is not None:
+                await self.send_final(websocket, request)
+            if self.archive:
+                extension = (request.codec or Codec.UNKNOWN).extension
+                await asyncio.to_thread(
+                    request.buffer.archive, request.dir / f"stream{extension}"
+                )
+        finally:
+            request.close()
+        session.requests_finished += 1
+        self.on_transmission_finished()
+
+    async def complete_request(
+        self, websocket, session: ClientSession, request_id: str
+    ):
+        """
+        Finish a request and tell the client it is done.
+        """
+        try:
+            await self.finish_request(websocket, session, request_id)
+            await websocket.send(json.dumps({"type": "done", "request_id": request_id}))
+        except websockets.ConnectionClosed:
+            logger.info(f"Client disconnected before request {request_id} finished")
+        except Exception as e:
+            logger.error(f"Error finishing request {request_id}: {e}")
+            # the client still waits for the request to be done
+            try:
+                await websocket.send(
+                    json.dumps(
+                        {"type": "error", "request_id": request_id, "error": str(e)}
+                    )
+                )
+                await websocket.send(
+                    json.dumps({"type": "done", "request_id": request_id})
+                )
+            except websockets.ConnectionClosed:
+                pass
+
     async def handler(self, websocket):
         """
         Handle incoming WebSocket connections.
         """
-        chunk_idx = 0
+        if (
+            self.max_sessions is not None
+            and self.metrics.active_sessions >= self.max_sessions
+        ):
+            self.metrics.session_rejected()
+            logger.warning(f"Rejecting client, {self.max_sessions} sessions active")
+            await websocket.close(1013, "too many sessions")
+            return
+
+        framing = websocket.request.headers.get(FRAMING_HEADER)
+        if framing is not None and framing != str(PROTOCOL_VERSION):
+            logger.warning(f"Rejecting client speaking protocol version {framing}")
+            await websocket.close(1002, "unsupported protocol version")
+            return
+
+        session = ClientSession(
+            self.output_dir, self.buffer_size, self.spill, framed=framing is not None
+        )
+        self.metrics.session_opened()
+        try:
+            await self.serve_session(websocket, session)
+        finally:
+            for task in session.finishing:
+                task.cancel()
+            await asyncio.gather(*session.finishing, return_exceptions=True)
+            session.close()
+            if self.executor is not None:
+                self.executor.cancel(session.id)
+            self.metrics.session_closed(session.finished)
+        logger.info(f"Connection closed (session {session.id}).")
+
+    async def serve_session(self, websocket, session: ClientSession):
         while True:
             try:
                 # Receive a chunk
@@ -40,18 +355,35 @@ class VariableRateStreamerServer:
                 # If the message is a control message, process it
                 if isinstance(message, str):
                     if message == "done":
-                        logger.info("Client finished streaming.")
-                        self.on_transmission_finished()
+                        # legacy clients send one stream per connection
+                        await asyncio.gather(*session.finishing)
+                        await self.finish_request(websocket, session, session.id)
                         await self.on_done_processing(websocket)
                         break
-                else:
-                    # Save the received chunk
-                    chunk_file = self.output_dir / f"chunk_{chunk_idx:04d}.wav"
-                    with open(chunk_file, "wb") as f:
-                        f.write(message)
 
-                    logger.info(f"Received chunk {chunk_idx} ({len(message)} bytes)")
-                    chunk_idx += 1
+                    control = json.loads(message)
+                    if control.get("type") == "end":
+                        # finish in the background so frames of the client's
+                        # other requests keep flowing meanwhile
+                        task = asyncio.create_task(
+                            self.complete_request(
+                                websocket, session, control["request_id"]
+                            )
+                        )
+                        session.finishing.add(task)
+                        task.add_done_callback(session.finishing.discard)
+                    else:
+                        logger.warning(f"Unknown control message: {message}")
+                else:
+                    request, seq, frames = session.read_frames(message)
+                    logger.debug(
+                        f"Received chunk {seq} ({len(message)} bytes, "
+                        f"session {session.id}, request {request.id})"
+                    )
+                    self.metrics.chunk_received(len(message))
+                    for frame in frames:
+                        await self.process_frame(websocket, session, request, frame)
+                    await websocket.send(f"ack {seq} {request.id}")
 
             except websockets.ConnectionClosed as e:
                 logger.info(f"Client disconnected: {e}")
@@ -60,15 +392,50 @@ class VariableRateStreamerServer:
                 logger.error(f"Error: {e}")
                 break
 
-        logger.info("Connection closed.")
+    async def process_frame(
+        self,
+        websocket,
+        session: ClientSession,
+        request: StreamRequest,
+        frame: Frame,
+    ):
+        """
+        Buffer an in-order frame's payload and pass it on to transcription.
+        """
+        if request.codec is None:
+            request.codec = frame.codec
+        segments = await request.buffer.append_async(frame.payload)
+
+        if self.converter is not None:
+            if request.transcription is None:
+                request.transcription = self.create_transcription(
+                    websocket, session, request
+                )
+                await request.transcription.start(request.codec.ffmpeg_format)
+            for segment in segments:
+                await request.transcription.feed(segment)
+
+    async def log_metrics(self):
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            self.metrics.log(self.executor)
 
     async def start(self):
         """
         Start the WebSocket server.
         """
         logger.info(f"Starting server at ws://{self.host}:{self.port}")
-        start_server = await websockets.serve(self.handler, self.host, self.port)
-        await start_server.serve_forever()
+        start_server = await websockets.serve(
+            self.handler, self.host, self.port, compression=self.compression
+        )
+        metrics_task = None
+        if self.metrics_interval > 0:
+            metrics_task = asyncio.create_task(self.log_metrics())
+        try:
+            await start_server.serve_forever()
+        finally:
+            if metrics_task is not None:
+                metrics_task.cancel()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,236 @@
+import asyncio
+import time
+from subprocess import PIPE
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+from ..speech_to_text import SpeechToTextConverter
+from .executor import ExecutorBusy, InferenceExecutor
+
+SAMPLE_RATE = 16000  # whisper's input rate
+SAMPLE_WIDTH = 2  # the decoder outputs s16le
+
+
+class TranscriptionSession:
+    """
+    Incremental transcription of one streamed utterance.
+
+    Received chunks, in any container or codec ffmpeg can probe (the WAV and MP3
+    streams `VariableRateStreamerClient` sends), are piped through an ffmpeg
+    decoder producing 16 kHz mono PCM. While audio arrives, the last
+    `window_seconds` of it are re-transcribed every `partial_interval` seconds of
+    new audio and handed to `on_partial`. `finish` transcribes the window once
+    more, classifies the intent of the final text and reports how long each
+    stage took.
+    """
+
+    def __init__(
+        self,
+        converter: SpeechToTextConverter,
+        classifier=None,
+        on_partial=None,
+        window_seconds: float = 30.0,
+        partial_interval: float = 1.0,
+        executor: Optional[InferenceExecutor] = None,
+        client_id=None,
+    ):
+        """
+        :param converter: Converter transcribing the decoded audio.
+        :param classifier: Optional callable mapping a transcript to a
+            (label, score) tuple, e.g. an `ActionClassifier`.
+        :param on_partial: Optional coroutine function called with each partial
+            transcript and the seconds of audio it covers.
+        :param window_seconds: Seconds of the most recent audio transcribed.
+        :param partial_interval: Seconds of new audio between partial
+            transcripts. Set to 0 to disable partials.
+        :param executor: Executor the model calls are run on, shared with the
+            server's other sessions. Without one they run in a fresh thread.
+        :param client_id: Client the session's calls are queued under.
+        """
+        self.converter = converter
+        self.classifier = classifier
+        self.on_partial = on_partial
+        self.window_seconds = window_seconds
+        self.partial_interval = partial_interval
+        self.executor = executor
+        self.client_id = client_id
+
+        self.decoder = None
+        self.decoder_task = None
+        self.partial_task = None
+        self.pending = set()  # executor futures of this session
+        self.pcm = bytearray()  # rolling window of decoded samples
+        self.samples_decoded = 0
+        self.samples_at_last_partial = 0
+        self.partials = []
+
+        self.started_at = None
+        self.first_audio_at = None
+        self.timings = {}
+
+    async def start(self, input_format: Optional[str] = None):
+        """
+        Start the ffmpeg decoder.
+
+        :param input_format: ffmpeg demuxer of the stream, e.g. "mp3" from the
+            codec in the frame headers. ffmpeg probes the input if None.
+        """
+        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error"]
+        if input_format is not None:
+            cmd += ["-f", input_format]
+        cmd += [
+            "-i",
+            "pipe:0",
+            "-f",
+            "s16le",
+            "-ac",
+            "1",
+            "-ar",
+            str(SAMPLE_RATE),
+            "pipe:1",
+        ]
+        self.decoder = await asyncio.create_subprocess_exec(
+            *cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE
+        )
+        self.decoder_task = asyncio.create_task(self.read_decoder_output())
+        self.started_at = time.perf_counter()
+
+    async def feed(self, chunk: bytes):
+        """
+        Pass received audio (any bytes-like object) to the decoder.
+        """
+        self.decoder.stdin.write(chunk)
+        await self.decoder.stdin.drain()
+
+    async def read_decoder_output(self):
+        """
+        Append decoded audio to the rolling window and start a partial
+        transcription whenever enough new audio arrived and none is running.
+        """
+        max_bytes = int(self.window_seconds * SAMPLE_RATE) * SAMPLE_WIDTH
+        while True:
+            pcm = await self.decoder.stdout.read(SAMPLE_RATE * SAMPLE_WIDTH // 10)
+            if not pcm:
+                break
+            if self.first_audio_at is None:
+                self.first_audio_at = time.perf_counter()
+
+            self.pcm += pcm
+            if len(self.pcm) > max_bytes:
+                del self.pcm[: len(self.pcm) - max_bytes]
+            self.samples_decoded += len(pcm) // SAMPLE_WIDTH
+
+            new_seconds = (self.samples_decoded - self.samples_at_last_partial) / SAMPLE_RATE
+            if (
+                self.partial_interval > 0
+                and new_seconds >= self.partial_interval
+                and (self.partial_task is None or self.partial_task.done())
+            ):
+                self.samples_at_last_partial = self.samples_decoded
+                self.partial_task = asyncio.create_task(self.run_partial())
+
+    def window(self) -> np.ndarray:
+        """
+        The current window as the float32 samples whisper expects.
+        """
+        usable = len(self.pcm) - len(self.pcm) % SAMPLE_WIDTH
+        samples = np.frombuffer(bytes(self.pcm[:usable]), dtype=np.int16)
+        return samples.astype(np.float32) / 32768
+
+    async def infer(self, fn, *args):
+        """
+        Run a blocking model call off the event loop.
+        """
+        if self.executor is None:
+            return await asyncio.to_thread(fn, *args)
+        future = self.executor.submit(self.client_id, fn, *args)
+        self.pending.add(future)
+        try:
+            return await future
+        finally:
+            self.pending.discard(future)
+
+    async def run_partial(self):
+        audio_seconds = self.samples_decoded / SAMPLE_RATE
+        try:
+            text = await self.infer(self.converter.transcribe_array, self.window())
+        except ExecutorBusy:
+            # partials are best effort; the final transcript covers this audio
+            logger.debug(f"Skipped partial transcript at {audio_seconds:.1f}s")
+            return
+        self.partials.append((audio_seconds, text))
+        logger.debug(f"Partial transcript at {audio_seconds:.1f}s: {text}")
+        if self.on_partial is not None:
+            await self.on_partial(text, audio_seconds)
+
+    async def finish(self) -> dict:
+        """
+        Flush the decoder and produce the final transcript and intent.
+
+        :raises ExecutorBusy: If the executor has no room for the final calls.
+        :return: A dict with the final "text", the "intent" label and its
+            "score" (None without a classifier), the seconds of "audio" received
+            and the per-stage "timings" in seconds.
+        """
+        finished_at = time.perf_counter()
+        self.decoder.stdin.close()
+        await self.decoder_task
+        await self.decoder.wait()
+        if self.decoder.returncode != 0:
+            error = await self.decoder.stderr.read()
+            logger.error(f"Decoder failed: {error.decode(errors='replace').strip()}")
+        decoded_at = time.perf_counter()
+
+        # the final transcript supersedes any partial still running
+        if self.partial_task is not None:
+            await asyncio.gather(self.partial_task, return_exceptions=True)
+        partials_done_at = time.perf_counter()
+
+        text = ""
+        if self.samples_decoded:
+            text = await self.infer(self.converter.transcribe_array, self.window())
+        transcribed_at = time.perf_counter()
+
+        intent, score = None, None
+        if self.classifier is not None and text:
+            intent, score = await self.infer(self.classifier, text)
+        classified_at = time.perf_counter()
+
+        self.timings = {
+            "receive": finished_at - self.started_at,
+            "first_audio": (
+                self.first_audio_at - self.started_at if self.first_audio_at else None
+            ),
+            "decode": decoded_at - finished_at,
+            "partial_wait": partials_done_at - decoded_at,
+            "transcribe": transcribed_at - partials_done_at,
+            "classify": classified_at - transcribed_at,
+            "total": classified_at - finished_at,
+        }
+        logger.info(
+            f"Transcribed {self.samples_decoded / SAMPLE_RATE:.1f}s of audio "
+            f"in {self.timings['total'] * 1000:.0f}ms after the last chunk: {text}"
+        )
+        return {
+            "text": text,
+            "intent": intent,
+            "score": score,
+            "audio": self.samples_decoded / SAMPLE_RATE,
+            "partials": len(self.partials),
+            "timings": self.timings,
+        }
+
+    def close(self):
+        """
+        Kill the decoder, e.g. when the client disconnected mid-stream.
+        """
+        if self.partial_task is not None:
+            self.partial_task.cancel()
+        if self.decoder_task is not None:
+            self.decoder_task.cancel()
+        if self.decoder is not None and self.decoder.returncode is None:
+            self.decoder.kill()
+        for future in self.pending:
+            future.cancel()
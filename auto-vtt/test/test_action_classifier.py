@@ -0,0 +1,65 @@
+import sys
+import types
+
+import pytest
+
+from src.auto_vtt.inferencing import action_classifier
+from src.auto_vtt.inferencing.action_classifier import ActionClassifier
+
+
+class FakePipeline:
+    """
+    Zero-shot pipeline that records its inputs and always picks the first label.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, sequences, labels, batch_size=None):
+        self.calls.append(list(sequences))
+        return [{"labels": labels, "scores": [0.9, 0.1]} for _ in sequences]
+
+
+@pytest.fixture
+def fake_pipeline(monkeypatch):
+    """
+    Patches `transformers.pipeline` so classifiers load a `FakePipeline`
+    instead of downloading a model. The whole module is replaced, since
+    transformers resolves its attributes lazily.
+    """
+    loaded = []
+
+    def pipeline(task, model, device, torch_dtype):
+        loaded.append(FakePipeline())
+        return loaded[-1]
+
+    transformers = types.ModuleType("transformers")
+    transformers.pipeline = pipeline
+    monkeypatch.setitem(sys.modules, "transformers", transformers)
+    monkeypatch.setattr(action_classifier, "pipelines", {})
+    return loaded
+
+
+def test_classify_batch_sends_original_transcripts(fake_pipeline):
+    classifier = ActionClassifier(["music", "news"], cache_size=0)
+    results = classifier.classify_batch(
+        ["Play some MUSIC!", "play some music", "What's the news?"]
+    )
+
+    (pipeline,) = fake_pipeline
+    # one model input per normalized transcript, in its original spelling
+    assert pipeline.calls == [["Play some MUSIC!", "What's the news?"]]
+    assert results == [("music", 0.9)] * 3
+
+
+def test_pipeline_loads_on_first_classification(fake_pipeline):
+    classifier = ActionClassifier(["music", "news"])
+    other = ActionClassifier(["lights"])
+    assert action_classifier.pipelines == {}
+    assert fake_pipeline == []
+
+    assert classifier("play some music") == ("music", 0.9)
+    assert len(action_classifier.pipelines) == 1
+    # classifiers of the same model share it
+    assert other("lights on") == ("lights", 0.9)
+    assert len(fake_pipeline) == 1
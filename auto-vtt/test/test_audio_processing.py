@@ -1,9 +1,13 @@
 # run with: PYTHONPATH=src pytest test/test_audio_processing.py
 
 import pytest
+import numpy as np
 from pathlib import Path
+from pydub import AudioSegment
 
-from src.auto_vtt.audio_processing import AudioProcessor
+from src.auto_vtt.audio_processing import AudioProcessor, NoiseCondition, dsp
+from src.auto_vtt.audio_processing.cache import ProcessedAudioCache
+from src.auto_vtt.audio_processing.noise_bank import NoiseBank
 
 resource_path = Path("test/resources")
 output_path = Path("test/resources/tmp")
@@ -21,5 +25,88 @@ def test_car_audio_processing():
     assert True
 
 
+def test_processed_audio_cache(tmp_path):
+    processor = AudioProcessor(seed=0)
+    cache = ProcessedAudioCache(tmp_path)
+    audio_path = resource_path / "test_audio.wav"
+
+    processed = cache.get_or_process(processor, audio_path)
+    cached = cache.get_or_process(processor, audio_path)
+    assert len(list(tmp_path.glob("*.npz"))) == 1
+    assert cached.keys() == processed.keys()
+    for noisetype, result in processed.items():
+        assert cached[noisetype].raw_data == result.raw_data
+        assert cached[noisetype].frame_rate == result.frame_rate
+
+    # a seeded processor reproduces what was cached
+    recomputed = processor.process_file(audio_path)
+    assert recomputed["noise"].raw_data == processed["noise"].raw_data
+
+def test_low_pass_matches_pydub():
+    audio = AudioSegment.from_file(resource_path / "test_audio.wav")
+    for cutoff in (1000, 5000, 8000):
+        expected = dsp.segment_to_array(audio.low_pass_filter(cutoff))
+        filtered = dsp.low_pass(dsp.segment_to_array(audio), cutoff, audio.frame_rate)
+        # pydub truncates every sample to an integer
+        assert np.abs(filtered - expected).max() <= 2 / 32768
+
+
+def test_processed_variants_keep_input_format():
+    processor = AudioProcessor()
+    audio = AudioSegment.from_file(resource_path / "test_audio.wav")
+
+    processed_audio_results = processor.process_audio(audio)
+    assert list(processed_audio_results) == processor.noise_types
+    for result in processed_audio_results.values():
+        assert result.frame_rate == audio.frame_rate
+        assert result.channels == audio.channels
+        assert result.frame_count() == audio.frame_count()
+
+
+def test_noise_bank_persists_converted_noises(tmp_path):
+    bank = NoiseBank(cache_dir=tmp_path)
+    samples, loudness = bank.get("ac", 16000, 1)
+    assert samples.dtype == np.float32
+    assert samples.shape[1] == 1
+
+    # a second bank reuses the persisted arrays without decoding anything
+    other = NoiseBank(cache_dir=tmp_path)
+    other_samples, other_loudness = other.get("ac", 16000, 1)
+    assert not other.decoded
+    assert isinstance(other_samples, np.memmap)
+    assert np.array_equal(other_samples, samples)
+    assert other_loudness == loudness
+
+
+def test_batch_audio_processing():
+    processor = AudioProcessor()
+    audio_path = resource_path / "test_audio.wav"
+    audio = AudioSegment.from_file(audio_path)
+
+    batch = processor.process_batch(
+        [audio_path, audio_path], noise_types=["ac", "turnsignal"], snr_targets={"ac": -10}
+    )
+    assert batch.noise_types == ["ac", "turnsignal"]
+    assert batch.samples.shape == (2, 2, batch.lengths.max())
+    assert batch.samples.dtype == np.float32
+    assert list(batch.lengths) == [audio.frame_count()] * 2
+    assert len(batch.clips("turnsignal")) == 2
+
+
+def test_selected_noise_conditions():
+    audio = AudioSegment.from_file(resource_path / "test_audio.wav")
+    processor = AudioProcessor(seed=0, noise_types=["turnsignal"])
+    assert list(processor.process_audio(audio)) == ["turnsignal"]
+    assert list(processor.config["car_noises"]) == ["turnsignal"]
+
+    full = AudioProcessor(seed=0).process_audio(audio)
+    assert processor.process_audio(audio)["turnsignal"].raw_data == full["turnsignal"].raw_data
+
+    custom = AudioProcessor(conditions={"loud_ac": NoiseCondition("ac", 0, 4000)})
+    assert custom.noise_types == ["loud_ac"]
+    with pytest.raises(ValueError):
+        AudioProcessor(noise_types=["rain"])
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -1,7 +1,13 @@
 # import pytest
 from pathlib import Path
 
-from src.auto_vtt.speech_to_text import SpeechToTextConverter
+import numpy as np
+from pydub import AudioSegment
+import torch
+import whisper
+
+from src.auto_vtt.speech_to_text import SpeechToTextConverter, audio_segment_to_array
+from src.auto_vtt.speech_to_text.registry import ModelRegistry
 
 resource_path = Path("test/resources/tmp")
 
@@ -11,3 +17,86 @@ def test_audio_transcription():
     audio_path = resource_path / "processed_audio_turnsignal.wav"
     transcription = converter.transcribe(audio_path)
     assert transcription == "Activate basement lights."
+
+
+def test_audio_segment_to_array():
+    audio = AudioSegment.from_file("test/resources/test_audio.wav").set_frame_rate(44100)
+    samples = audio_segment_to_array(audio)
+
+    assert samples.dtype == np.float32
+    assert abs(len(samples) - len(audio) * 16) <= 16
+    assert np.abs(samples).max() <= 1.0
+
+
+def test_in_memory_transcription():
+    converter = SpeechToTextConverter(SpeechToTextConverter.ModelSize.TINY)
+    audio = AudioSegment.from_file(resource_path / "processed_audio_turnsignal.wav")
+    transcription = converter.transcribe(audio)
+    assert transcription == "Activate basement lights."
+
+
+def test_batch_transcription():
+    converter = SpeechToTextConverter(SpeechToTextConverter.ModelSize.TINY)
+    audio = AudioSegment.from_file(resource_path / "processed_audio_turnsignal.wav")
+    silence = AudioSegment.silent(duration=1000, frame_rate=16000)
+
+    transcriptions = converter.transcribe_batch([audio, silence, audio], batch_size=2)
+    assert len(transcriptions) == 3
+    assert transcriptions[0] == transcriptions[2] == "Activate basement lights."
+
+
+def test_converters_share_models():
+    registry = ModelRegistry()
+    converter = SpeechToTextConverter(SpeechToTextConverter.ModelSize.TINY, registry=registry)
+    other = SpeechToTextConverter(SpeechToTextConverter.ModelSize.TINY, registry=registry)
+    assert converter.model is other.model
+    # inference on a shared model is serialized across converters
+    assert converter.lock is other.lock
+    assert len(registry.models) == 1
+
+    quantized = SpeechToTextConverter(
+        SpeechToTextConverter.ModelSize.TINY, device="cpu", quantized=True, registry=registry
+    )
+    audio = AudioSegment.from_file(resource_path / "processed_audio_turnsignal.wav")
+    assert quantized.transcribe(audio) == "Activate basement lights."
+
+
+def test_cpu_model_decodes_in_float32_on_cuda_hosts(monkeypatch):
+    # an untrained model with tiny layers, so the test needs no download
+    dims = whisper.model.ModelDimensions(
+        n_mels=80,
+        n_audio_ctx=1500,
+        n_audio_state=8,
+        n_audio_head=1,
+        n_audio_layer=1,
+        n_vocab=51864,
+        n_text_ctx=448,
+        n_text_state=8,
+        n_text_head=1,
+        n_text_layer=1,
+    )
+    monkeypatch.setattr(
+        whisper, "load_model", lambda name, device: whisper.Whisper(dims).to(device)
+    )
+    monkeypatch.setattr(torch.cuda, "is_available", lambda: True)
+    decoded = []
+
+    def decode(model, mels, options):
+        decoded.append(options)
+        return [
+            whisper.DecodingResult(audio_features=mel, language="en") for mel in mels
+        ]
+
+    monkeypatch.setattr(whisper, "decode", decode)
+
+    converter = SpeechToTextConverter(
+        SpeechToTextConverter.ModelSize.TINY,
+        device="cpu",
+        quantized=True,
+        registry=ModelRegistry(),
+    )
+    silence = AudioSegment.silent(duration=1000, frame_rate=16000)
+    assert converter.transcribe_batch([silence, silence]) == ["", ""]
+    # a quantized model's linear layers can't take half precision inputs
+    assert not converter.fp16
+    assert [options.fp16 for options in decoded] == [False]
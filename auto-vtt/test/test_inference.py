@@ -5,6 +5,7 @@ import openai
 import os
 
 from src.auto_vtt.inferencing.action_classifier import ActionClassifier
+from src.auto_vtt.inferencing.embedding_classifier import EmbeddingActionClassifier
 
 
 # OpenAI fixture
@@ -64,6 +65,28 @@ def test_multi_level_classification():
     assert action_label == "play"
 
 
+def test_batch_classification():
+    candidate_labels = ["music", "navigation", "news"]
+    classifier = ActionClassifier(candidate_labels)
+
+    results = classifier.classify_batch(
+        ["Drive me to work", "Play some pop", "play some pop!"]
+    )
+    assert [label for label, score in results] == ["navigation", "music", "music"]
+    assert results[1] == results[2]
+    assert list(classifier.cache) == ["drive me to work", "play some pop"]
+
+
+def test_embedding_classification():
+    candidate_labels = ["play:music", "bring:newspaper", "increase:volume"]
+    classifier = EmbeddingActionClassifier(candidate_labels)
+
+    results = classifier.classify_batch(
+        ["Play some music", "Bring me the newspaper", "Turn it up louder"]
+    )
+    assert [label for label, score in results] == candidate_labels
+
+
 def test_openai_inference(gpt4o):
     prompt = "Play some music"
     response = gpt4o(prompt)
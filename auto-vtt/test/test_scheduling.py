@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+from src.auto_vtt.scheduling import (
+    Location,
+    ModelProfile,
+    ModelSize,
+    OffloadScheduler,
+)
+
+LOCAL_TINY = ModelProfile(Location.LOCAL, ModelSize.TINY, compute_seconds=0.4, wer=0.3)
+LOCAL_BASE = ModelProfile(Location.LOCAL, ModelSize.BASE, compute_seconds=0.9, wer=0.2)
+REMOTE_SMALL = ModelProfile(
+    Location.REMOTE, ModelSize.SMALL, compute_seconds=0.2, wer=0.1
+)
+
+
+def test_scheduler_follows_the_link():
+    scheduler = OffloadScheduler([LOCAL_TINY, LOCAL_BASE, REMOTE_SMALL], max_wer=0.25)
+
+    # nothing measured yet: explore the link once, then stay on the car within
+    # the accuracy floor
+    assert scheduler.choose(64000, 2.0).explore
+    assert scheduler.choose(64000, 2.0).profile == LOCAL_BASE
+
+    # fast link: 0.05s RTT and 64 kB in 0.1s
+    scheduler.link.observe_rtt(0.05)
+    scheduler.link.observe_throughput(5_120_000)
+    decision = scheduler.choose(64000, 2.0)
+    assert decision.profile == REMOTE_SMALL
+    assert abs(decision.expected_latency - 0.35) < 1e-9
+    assert LOCAL_TINY not in decision.candidates
+
+    # the link degrades until uploading costs more than computing locally
+    for _ in range(50):
+        scheduler.link.observe_rtt(1.0)
+        scheduler.link.observe_throughput(256_000)
+    assert scheduler.choose(64000, 2.0).location is Location.LOCAL
+
+
+def test_scheduler_learns_compute_latency():
+    scheduler = OffloadScheduler([LOCAL_BASE, REMOTE_SMALL], alpha=0.5)
+    scheduler.link.observe_rtt(0.1)
+    scheduler.link.observe_throughput(1_000_000)
+    assert scheduler.choose(64000, 2.0).location is Location.REMOTE
+
+    # the server is queueing requests
+    scheduler.observe_compute(REMOTE_SMALL, 2.0)
+    assert scheduler.compute_seconds[REMOTE_SMALL] == 1.1
+    assert scheduler.choose(64000, 2.0).location is Location.LOCAL
+
+
+def test_scheduler_explores_a_cold_or_stale_link():
+    scheduler = OffloadScheduler(
+        [LOCAL_TINY, REMOTE_SMALL], max_link_age=30.0, explore_every=3
+    )
+
+    decision = scheduler.choose(64000, 2.0)
+    assert decision.explore and decision.profile == REMOTE_SMALL
+    # the exploring transfer failed to measure anything: retry every 3rd decision
+    assert [scheduler.choose(64000, 2.0).explore for _ in range(4)] == [
+        False,
+        False,
+        True,
+        False,
+    ]
+
+    # a fast transfer: first chunk acked after 50ms, 64 kB in 100ms
+    timings = [
+        {"bytes": 32000, "sent_at": 0.0, "acked_at": 0.05},
+        {"bytes": 32000, "sent_at": 0.01, "acked_at": 0.1},
+    ]
+    scheduler.link.observe_transfer(timings)
+    decision = scheduler.choose(64000, 2.0)
+    assert not decision.explore and decision.profile == REMOTE_SMALL
+
+    # pings from an adaptive stream keep the estimate fresh
+    client = SimpleNamespace(rtts=[0.05, 0.06], throughputs=[5_000_000])
+    scheduler.link.observe_client(client)
+    scheduler.link.observe_client(client)  # nothing new
+    assert scheduler.link.client_rtts_seen == 2
+    assert abs(scheduler.link.rtt - 0.05125) < 1e-9
+
+    # no samples for longer than max_link_age: explore again
+    scheduler.link.updated_at -= 60
+    assert scheduler.choose(64000, 2.0).explore
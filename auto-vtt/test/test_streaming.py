@@ -0,0 +1,455 @@
+import asyncio
+import threading
+import uuid
+
+import pytest
+from pydub import AudioSegment
+import websockets
+
+from src.auto_vtt.streaming.buffer import ReceiveBuffer
+from src.auto_vtt.streaming.client import VariableRateStreamerClient
+from src.auto_vtt.streaming.executor import ExecutorBusy, InferenceExecutor
+from src.auto_vtt.streaming.protocol import (
+    Codec,
+    Reassembler,
+    decode_frame,
+    encode_frame,
+)
+from src.auto_vtt.streaming.server import ClientSession, VariableRateStreamerServer
+
+
+async def serve(handler):
+    """
+    A WebSocket server on a free loopback port, and its URI.
+    """
+    server = await websockets.serve(handler, "127.0.0.1", 0)
+    return server, f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+
+class WindowTrackingClient(VariableRateStreamerClient):
+    """
+    Records how many chunks are unacknowledged each time one is sent.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.live_timings = []
+        self.unacked = []
+
+    async def read_acks(self, timings, in_flight):
+        self.live_timings = timings
+        await super().read_acks(timings, in_flight)
+
+    def frame(self, seq, chunk, codec, bitrate):
+        self.unacked.append(sum(t["acked_at"] is None for t in self.live_timings))
+        return super().frame(seq, chunk, codec, bitrate)
+
+
+def test_receive_buffer_spills_and_archives(tmp_path):
+    buffer = ReceiveBuffer(capacity=10, spill_path=tmp_path / "spill.bin")
+    data = bytes(range(256)) * 4
+
+    received = b""
+    for offset in range(0, len(data), 7):
+        segments = buffer.append(data[offset : offset + 7])
+        received += b"".join(bytes(segment) for segment in segments)
+    assert received == data
+    assert b"".join(bytes(segment) for segment in buffer.contents()) == data[-10:]
+    assert buffer.spilled == len(data) - 10
+
+    buffer.archive(tmp_path / "stream.bin")
+    assert (tmp_path / "stream.bin").read_bytes() == data
+    assert not (tmp_path / "spill.bin").exists()
+
+
+def test_receive_buffer_grows_lazily():
+    buffer = ReceiveBuffer(capacity=1 << 20)
+    assert len(buffer.buffer) == 0
+    first = buffer.append(b"abc")
+    buffer.append(b"defgh")
+    assert len(buffer.buffer) == 8
+    assert bytes(first[0]) == b"abc"
+    assert b"".join(bytes(segment) for segment in buffer.contents()) == b"abcdefgh"
+
+
+def test_receive_buffer_without_spill_keeps_the_tail():
+    buffer = ReceiveBuffer(capacity=10)
+    buffer.append(b"0123456789")
+    buffer.append(b"abc")
+    assert b"".join(bytes(segment) for segment in buffer.contents()) == b"3456789abc"
+    assert buffer.dropped == 3
+
+
+def test_frame_round_trip():
+    session = uuid.uuid4()
+    message = encode_frame(session, 7, b"payload", Codec.MP3, 96000, captured_at=12.5)
+
+    frame = decode_frame(message)
+    assert frame.session == session
+    assert frame.seq == 7
+    assert frame.captured_at == 12.5
+    assert frame.codec == Codec.MP3
+    assert frame.bitrate == 96000
+    assert bytes(frame.payload) == b"payload"
+
+    # raw chunks from clients without framing are passed through
+    assert decode_frame(b"RIFF\x00\x00\x00\x00WAVE") is None
+    assert Codec.sniff(b"RIFF\x00\x00\x00\x00WAVE") == Codec.WAV
+
+
+def test_reassembler_orders_frames():
+    session = uuid.uuid4()
+    frames = [decode_frame(encode_frame(session, seq, bytes([seq]))) for seq in range(4)]
+    reassembler = Reassembler()
+
+    assert reassembler.push(frames[1]) == []
+    assert reassembler.push(frames[0]) == frames[:2]
+    assert reassembler.push(frames[0]) == []
+    assert reassembler.push(frames[3]) == []
+    assert reassembler.push(frames[2]) == frames[2:]
+    assert reassembler.duplicates == 1
+
+
+def test_client_session_separates_requests(tmp_path):
+    session = ClientSession(tmp_path, buffer_size=64, spill=False)
+    first, second = uuid.uuid4(), uuid.uuid4()
+
+    request, seq, frames = session.read_frames(encode_frame(first, 0, b"a"))
+    assert request.id == first.hex and seq == 0 and len(frames) == 1
+    request, _, _ = session.read_frames(encode_frame(second, 0, b"b"))
+    assert request.id == second.hex
+    assert set(session.requests) == {first.hex, second.hex}
+    with pytest.raises(ValueError):
+        session.read_frames(b"RIFF\x00\x00\x00\x00WAVE")
+    session.close()
+    assert not session.requests
+
+
+def test_legacy_session_never_parses_frames(tmp_path):
+    session = ClientSession(tmp_path, buffer_size=64, spill=False, framed=False)
+    # raw audio that happens to start like a frame of another version
+    chunk = b"AV\x07" + bytes(64)
+    request, seq, frames = session.read_frames(chunk)
+    assert request.id == session.id and seq == 0
+    assert bytes(frames[0].payload) == chunk
+    request, seq, _ = session.read_frames(b"more")
+    assert request.id == session.id and seq == 1
+    session.close()
+
+
+def test_executor_runs_clients_round_robin():
+    async def run():
+        executor = InferenceExecutor(max_workers=1)
+        release = threading.Event()
+        order = []
+        # hold the only worker while the queues fill up
+        blocker = executor.submit("other", release.wait)
+        calls = [
+            executor.submit(client, order.append, f"{client}{i}")
+            for client, count in (("a", 3), ("b", 2))
+            for i in range(count)
+        ]
+        assert executor.queued == 5 and executor.running == 1
+        release.set()
+        await asyncio.gather(blocker, *calls)
+        executor.shutdown()
+        return order
+
+    assert asyncio.run(run()) == ["a0", "b0", "a1", "b1", "a2"]
+
+
+def test_executor_rejects_and_cancels():
+    async def run():
+        executor = InferenceExecutor(
+            max_workers=1, max_queued=3, max_queued_per_client=2
+        )
+        release = threading.Event()
+        blocker = executor.submit("other", release.wait)
+
+        a = [executor.submit("a", str, i) for i in range(2)]
+        with pytest.raises(ExecutorBusy):
+            executor.submit("a", str, 2)  # over the per-client limit
+        b = executor.submit("b", str, 0)
+        with pytest.raises(ExecutorBusy):
+            executor.submit("c", str, 0)  # over the global limit
+        assert executor.rejected == 2
+
+        executor.cancel("a")
+        assert all(future.cancelled() for future in a)
+        assert executor.queued == 1
+        release.set()
+        await blocker
+        assert await b == "0"
+        assert executor.queued == 0 and executor.running == 0
+        executor.shutdown()
+
+    asyncio.run(run())
+
+
+def test_stream_chunks_bounds_unacked_chunks(tmp_path):
+    async def run():
+        receiver = VariableRateStreamerServer(
+            tmp_path, lambda: None, metrics_interval=0, archive=True
+        )
+        server, uri = await serve(receiver.handler)
+        data = bytes(range(256)) * 64
+        client = WindowTrackingClient(uri, chunk_size=256)
+        async with client:
+            timings = await client.stream_chunks(data, max_in_flight=3)
+        server.close()
+        return data, client, timings
+
+    data, client, timings = asyncio.run(run())
+    assert len(timings) == len(data) // 256
+    assert max(client.unacked) <= 3
+    assert all(t["acked_at"] >= t["sent_at"] for t in timings)
+    (archived,) = tmp_path.glob("*/*/stream.bin")
+    assert archived.read_bytes() == data
+
+
+def test_stream_chunks_fails_when_connection_drops():
+    async def close_after_four_chunks(websocket):
+        for _ in range(4):
+            await websocket.recv()
+        await websocket.close()
+
+    async def run():
+        server, uri = await serve(close_after_four_chunks)
+        client = VariableRateStreamerClient(uri, chunk_size=256)
+        async with client:
+            # the window is full when the server goes away without acking
+            with pytest.raises(websockets.ConnectionClosed):
+                await asyncio.wait_for(
+                    client.stream_chunks(bytes(256 * 16), max_in_flight=4), 5
+                )
+        server.close()
+
+    asyncio.run(run())
+
+
+def test_stream_adaptive_splices_bitrate_switches(tmp_path):
+    wav_path = "test/resources/test_audio.wav"
+
+    async def run():
+        receiver = VariableRateStreamerServer(
+            tmp_path, lambda: None, metrics_interval=0, archive=True
+        )
+        server, uri = await serve(receiver.handler)
+        client = VariableRateStreamerClient(
+            uri,
+            chunk_size=1024,
+            initial_bitrate=64000,
+            adaptation_interval=2,
+            ladder=True,
+        )
+        async with client:
+            timings = await client.stream_adaptive(wav_path)
+        server.close()
+        return client, timings
+
+    client, timings = asyncio.run(run())
+    # loopback is fast, so the client keeps stepping up the ladder
+    assert client.switches
+    assert all(t["acked_at"] is not None for t in timings)
+
+    # no audio is lost at the switches; each encoder only adds its priming
+    # and padding, under two 26ms MP3 frames
+    (archived,) = tmp_path.glob("*/*/stream.mp3")
+    sent = AudioSegment.from_file(archived, format="mp3")
+    original = AudioSegment.from_file(wav_path)
+    assert len(original) <= len(sent) <= len(original) + 60 * (len(client.switches) + 1)
+
+
+def test_stream_adaptive_small_blocks_do_not_stall(tmp_path):
+    wav_path = "test/resources/test_audio.wav"
+
+    async def run():
+        receiver = VariableRateStreamerServer(
+            tmp_path, lambda: None, metrics_interval=0, archive=True
+        )
+        server, uri = await serve(receiver.handler)
+        client = VariableRateStreamerClient(uri, chunk_size=128)
+        async with client:
+            # a single 8ms block of lookahead is far below the encoder's delay
+            timings = await asyncio.wait_for(
+                client.stream_adaptive(wav_path, lookahead=1), 30
+            )
+        server.close()
+        return timings
+
+    timings = asyncio.run(run())
+    assert all(t["acked_at"] is not None for t in timings)
+    (archived,) = tmp_path.glob("*/*/stream.mp3")
+    sent = AudioSegment.from_file(archived, format="mp3")
+    assert len(sent) >= len(AudioSegment.from_file(wav_path))
+
+
+def test_send_utterance_resends_after_connection_drop(tmp_path):
+    receiver = VariableRateStreamerServer(tmp_path, lambda: None, metrics_interval=0)
+    connections = []
+
+    async def drop_first_connection(websocket):
+        connections.append(websocket)
+        if len(connections) == 1:
+            for _ in range(4):
+                await websocket.recv()
+            await websocket.close()
+        else:
+            await receiver.handler(websocket)
+
+    async def run():
+        server, uri = await serve(drop_first_connection)
+        client = VariableRateStreamerClient(uri, chunk_size=256, reconnect_delay=0.01)
+        async with client:
+            await asyncio.wait_for(
+                client.send_utterance(bytes(256 * 16), max_in_flight=4), 5
+            )
+        server.close()
+        return client
+
+    client = asyncio.run(run())
+    assert len(connections) == 2
+    assert len(client.chunk_timings) == 16
+
+
+class FailingConverter:
+    def transcribe_array(self, samples):
+        raise RuntimeError("model failed")
+
+
+def test_failed_request_is_reported_done(tmp_path):
+    async def run():
+        receiver = VariableRateStreamerServer(
+            tmp_path, lambda: None, converter=FailingConverter(), metrics_interval=0
+        )
+        server, uri = await serve(receiver.handler)
+        client = VariableRateStreamerClient(uri)
+        async with client:
+            result = await asyncio.wait_for(
+                client.send_utterance("test/resources/test_audio.wav"), 10
+            )
+        server.close()
+        return result
+
+    result = asyncio.run(run())
+    assert result["type"] == "error"
+    assert result["error"] == "model failed"
+
+
+class EchoConverter:
+    def transcribe_array(self, samples):
+        return str(len(samples))
+
+
+def test_submit_matches_replies_by_request_id(tmp_path):
+    data = open("test/resources/test_audio.wav", "rb").read()
+
+    async def run(converter):
+        receiver = VariableRateStreamerServer(
+            tmp_path, lambda: None, converter=converter, metrics_interval=0
+        )
+        server, uri = await serve(receiver.handler)
+        client = VariableRateStreamerClient(uri, chunk_size=1024)
+        async with client:
+            futures = [
+                await client.submit(data[: len(data) // parts], max_in_flight=2)
+                for parts in (1, 2, 4)
+            ]
+            finished = [utterance async for utterance in client.results()]
+        server.close()
+        return futures, finished
+
+    futures, finished = asyncio.run(run(None))
+    assert all(future.result() is None for future in futures)
+    assert sorted(len(u.timings) for u in finished) == [19, 38, 75]
+    assert all(t["acked_at"] is not None for u in finished for t in u.timings)
+
+    futures, finished = asyncio.run(run(EchoConverter()))
+    samples = [int(future.result()["text"]) for future in futures]
+    assert samples[0] > samples[1] > samples[2] > 0
+    for utterance in finished:
+        assert utterance.result["request_id"] == utterance.id
+
+
+def test_submit_fails_pending_utterances_on_disconnect():
+    async def close_after_four_chunks(websocket):
+        for _ in range(4):
+            await websocket.recv()
+        await websocket.close()
+
+    async def run():
+        server, uri = await serve(close_after_four_chunks)
+        client = VariableRateStreamerClient(uri, chunk_size=256)
+        async with client:
+            futures = [await client.submit(bytes(256 * 16)) for _ in range(2)]
+            await asyncio.wait_for(asyncio.wait(futures), 5)
+            # give the senders a turn to notice
+            await asyncio.sleep(0.1)
+            senders = [
+                task
+                for task in asyncio.all_tasks()
+                if task.get_coro().__name__ == "send_request"
+            ]
+        server.close()
+        return futures, senders
+
+    futures, senders = asyncio.run(run())
+    for future in futures:
+        with pytest.raises(websockets.ConnectionClosed):
+            future.result()
+    assert not senders
+
+
+def test_close_cancels_submitted_senders():
+    async def never_ack(websocket):
+        async for _ in websocket:
+            pass
+
+    async def run():
+        server, uri = await serve(never_ack)
+        client = VariableRateStreamerClient(uri, chunk_size=256)
+        async with client:
+            future = await client.submit(bytes(256 * 16), max_in_flight=2)
+            await asyncio.sleep(0.1)
+            # blocked on the full window, and only referenced by the client
+            (sender,) = client.sender_tasks
+        server.close()
+        return future, sender, client
+
+    future, sender, client = asyncio.run(run())
+    assert sender.cancelled()
+    assert not client.sender_tasks
+    assert not future.done()
+
+
+class SlowPingClient(VariableRateStreamerClient):
+    """
+    Sees a 0.5s RTT on pings, as on a congested cellular link.
+    """
+
+    async def measure_rtt(self, websocket):
+        await asyncio.sleep(0.5)
+        return 0.5
+
+
+def test_stream_adaptive_pings_off_the_send_path(tmp_path):
+    async def run():
+        receiver = VariableRateStreamerServer(tmp_path, lambda: None, metrics_interval=0)
+        server, uri = await serve(receiver.handler)
+        client = SlowPingClient(uri, chunk_size=1024, adaptation_interval=2)
+        async with client:
+            start = asyncio.get_running_loop().time()
+            timings = await asyncio.wait_for(
+                client.stream_adaptive("test/resources/test_audio.wav"), 30
+            )
+            elapsed = asyncio.get_running_loop().time() - start
+            await client.rtt_task
+        server.close()
+        return client, timings, elapsed
+
+    client, timings, elapsed = asyncio.run(run())
+    adaptations = len(timings) // 2
+    # awaiting each ping would have stalled sending for a round trip each time
+    assert adaptations > 4
+    assert elapsed < 0.5 * adaptations / 2
+    assert client.rtts and client.rtts[0] == 0.5
@@ -8,6 +8,7 @@ from pydub import AudioSegment
 from loguru import logger
 
 from auto_vtt.audio_processing import AudioProcessor
+from auto_vtt.audio_processing.cache import ProcessedAudioCache
 from tqdm import tqdm
 
 
@@ -17,7 +18,20 @@ class VoiceDataset(Dataset):
         root_dir: Path,
         audio_processor: AudioProcessor,
         max_len: Optional[int] = None,
+        lazy: bool = False,
+        cache: Optional[ProcessedAudioCache] = None,
     ):
+        """
+        :param root_dir: Root of the Fluent Speech Commands dataset.
+        :param audio_processor: Processor producing the noisy variants of each
+            clip. Its `noise_types` decide which variants the dataset holds.
+        :param max_len: Only use the first `max_len` rows of the train split.
+        :param lazy: Process clips on access instead of at construction. Item
+            `idx` is variant `noise_types[idx % len(noise_types)]` of row
+            `idx // len(noise_types)`, the same order as the eager dataset.
+        :param cache: On-disk cache of processed clips, so repeated runs skip
+            audio augmentation.
+        """
         self.truth_csv = pd.read_csv(root_dir / "data" / "train_data.csv")
         self.truth_csv = self.truth_csv[
             (self.truth_csv["action"] != "none") & (self.truth_csv["object"] != "none")
@@ -27,27 +41,65 @@ class VoiceDataset(Dataset):
 
         self.root_dir = root_dir
         self.audio_processor = audio_processor
+        self.noise_types = audio_processor.noise_types
+        self.lazy = lazy
+        self.cache = cache
 
         self.data = []
-        self.init_data()
+        self.cached_row = None  # (row index, processed audios) of the last lazy access
+        if not lazy:
+            self.init_data()
 
     def init_data(self):
         logger.info("Initializing data")
         for row in tqdm(self.truth_csv.itertuples()):
-            audio_path = self.root_dir / row.path
-            audios = self.audio_processor.process_file(audio_path)
+            audios = self.process_file(self.root_dir / row.path)
             for type, audio in audios.items():
-                action = row.action
-                object = row.object
-                
-                data = {
-                    "label": f"{action}:{object}",
-                    "transcription": row.transcription
-                }
-                self.data.append((audio, data))
+                self.data.append((audio, self.row_data(row)))
+
+    def row_data(self, row) -> dict:
+        return {
+            "label": f"{row.action}:{row.object}",
+            "transcription": row.transcription,
+        }
+
+    def process_file(self, audio_path: Path) -> dict:
+        if self.cache is not None:
+            return self.cache.get_or_process(self.audio_processor, audio_path)
+        return self.audio_processor.process_file(audio_path)
+
+    def process_row(self, row_idx: int) -> dict:
+        """
+        Processes a row's clip, reusing the result of the previous call for the
+        same row so that iterating over its variants processes it once.
+        """
+        if self.cached_row is None or self.cached_row[0] != row_idx:
+            row = self.truth_csv.iloc[row_idx]
+            audios = self.process_file(self.root_dir / row.path)
+            self.cached_row = (row_idx, audios)
+        return self.cached_row[1]
 
     def __len__(self):
+        if self.lazy:
+            return len(self.truth_csv) * len(self.noise_types)
         return len(self.data)
 
     def __getitem__(self, idx):
-        return self.data[idx]
+        """
+        :param idx: Flat index, or a (row index, noise type) tuple in lazy mode.
+        """
+        if not self.lazy:
+            return self.data[idx]
+
+        if isinstance(idx, tuple):
+            row_idx, noise_type = idx
+        else:
+            if idx < 0:
+                idx += len(self)
+            if not 0 <= idx < len(self):
+                raise IndexError(f"Index {idx} out of range for {len(self)} items")
+            row_idx, type_idx = divmod(idx, len(self.noise_types))
+            noise_type = self.noise_types[type_idx]
+
+        audio = self.process_row(row_idx)[noise_type]
+        return audio, self.row_data(self.truth_csv.iloc[row_idx])
@@ -3,13 +3,14 @@ import numpy as np
 from collections import deque
 from dataclasses import dataclass
 
+from scipy.signal import lfilter, lfiltic
 from statsmodels.tsa.arima.model import ARIMA
 
 from . import LatencyProvider
 
 
-def with_prob(prob):
-    return np.random.rand() < prob
+def with_prob(prob, size=None):
+    return np.random.rand(*(() if size is None else (size,))) < prob
 
 
 @dataclass
@@ -33,34 +34,83 @@ class LatencyModel(LatencyProvider):
         self.spike_prob = spike_prob
         self.spike_len_remaining = 0
 
+        # oldest first, like the trace they continue
         self.prev_values = deque(data[-self.p :], maxlen=self.p)
         self.prev_resids = deque([0] * self.q, maxlen=self.q)
 
         self.fit = ARIMA(data, order=(self.p, 0, self.q)).fit()
-
-    def get_next_arima(self):
-        ar_term = np.dot(
-            self.fit.arparams, list(self.prev_values)[-len(self.fit.arparams) :]
+        # params is a plain array when the model was fit on one
+        params = dict(zip(self.fit.model.param_names, self.fit.params))
+        # statsmodels' ARIMA models y_t = const + u_t with u_t ARMA, so const is
+        # the mean of the process rather than the intercept of the recursion
+        self.mean = params.get("const", 0.0)
+        self.sigma = np.sqrt(params["sigma2"])
+
+    def get_mean_latency(self) -> float:
+        return self.dist_latency.mean
+
+    def get_std_latency(self) -> float:
+        return self.dist_latency.std
+
+    def generate_arima(self, n: int) -> np.ndarray:
+        """
+        Continue the fitted ARMA process for `n` steps.
+
+        All innovations are drawn at once and the recursion runs as one linear
+        filter, with initial conditions from the previous values and residuals.
+
+        :return: The next `n` latencies, without spikes.
+        """
+        noise = np.random.normal(scale=self.sigma, size=n)
+        # (1 - sum phi_i L^i) (y_t - mean) = (1 + sum theta_j L^j) e_t
+        a = np.r_[1.0, -np.asarray(self.fit.arparams)]
+        b = np.r_[1.0, np.asarray(self.fit.maparams)]
+        # lfiltic wants the history most recent first
+        zi = lfiltic(
+            b,
+            a,
+            y=np.asarray(self.prev_values, dtype=float)[::-1] - self.mean,
+            x=np.asarray(self.prev_resids, dtype=float)[::-1],
         )
-        ma_term = np.dot(
-            self.fit.maparams, list(self.prev_resids)[-len(self.fit.maparams) :]
+        values, _ = lfilter(b, a, noise, zi=zi)
+        values += self.mean
+
+        self.prev_values.extend(values[-self.p :] if self.p else ())
+        self.prev_resids.extend(noise[-self.q :] if self.q else ())
+        return values
+
+    def generate_spikes(self, n: int) -> np.ndarray:
+        """
+        Extra latency of `n` steps: each spikes with probability `spike_prob`,
+        by a non-negative amount drawn from `dist_spike`.
+        """
+        spikes = np.zeros(n)
+        mask = with_prob(self.spike_prob, n)
+        spikes[mask] = np.random.normal(
+            self.dist_spike.mean, self.dist_spike.std, size=np.count_nonzero(mask)
         )
+        return np.maximum(spikes, 0.0)
 
-        noise = np.random.normal(scale=np.sqrt(self.fit.params["sigma2"]))
-        next_val = self.fit.params["const"] + ar_term + ma_term + noise
+    def generate(self, n: int) -> np.ndarray:
+        """
+        The next `n` latencies, spikes included.
+        """
+        return self.generate_arima(n) + self.generate_spikes(n)
 
-        self.prev_values.append(next_val)
-        self.prev_resids.append(noise)
-
-        return next_val
+    def get_next_arima(self):
+        return self.generate_arima(1)[0]
 
     def get_next_latency(self) -> float:
-        return self.get_next_arima()
+        return self.generate(1)[0]
 
     def has_next(self) -> bool:
         return True
 
-    def iterator(self, n: int):
-        for i in range(n):
-            next_val = self.get_next_arima()
-            yield next_val
+    def iterator(self, n: int, block_size: int = 1 << 16):
+        """
+        Yield `n` latencies, generated `block_size` at a time.
+        """
+        while n > 0:
+            block = self.generate(min(n, block_size))
+            n -= len(block)
+            yield from block
@@ -3,12 +3,14 @@ import time
 from pathlib import Path
 from typing import List, Dict
 import asyncio
+import json
 
 from loguru import logger
 import pandas as pd
 import numpy as np
 
 from auto_vtt.audio_processing import AudioProcessor
+from auto_vtt.audio_processing.cache import ProcessedAudioCache
 from auto_vtt.speech_to_text import SpeechToTextConverter
 from auto_vtt.inferencing.action_classifier import ActionClassifier
 from network_sim.latency_provider import LatencyProvider
@@ -80,24 +82,49 @@ class TestRunner:
         logger.info("Server is ready")
         await asyncio.sleep(2)
 
-        for i in tqdm(range(100)):
-            audio_file, _ = self.dataset[np.random.randint(len(self.dataset))]
-            audio_file.export(self.input_dir / "example.wav", format="wav")
-            new_latency = self.latency_provider.get_mean_latency()
-            new_jitter = self.latency_provider.get_std_latency()
-            self.topo.update_latency(new_latency, new_jitter)
-
-            log_suffix = f"{new_latency}_{new_jitter}_{time.time()}"
-            client_process = client_node.popen(
-                f"uv run {client_runner_path} --server-ip {server_ip} --input_dir {self.input_dir} --log-suffix {log_suffix}"
-            )
-            # wait for client to finish
+        # one client process streams every utterance over a persistent connection
+        log_suffix = f"session_{time.time()}"
+        client_process = client_node.popen(
+            f"uv run {client_runner_path} --server-ip {server_ip} --input_dir {self.input_dir} --log-suffix {log_suffix} --interactive",
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+
+        results = []
+        try:
+            for i in tqdm(range(100)):
+                audio_file, _ = self.dataset[np.random.randint(len(self.dataset))]
+                utterance_path = self.input_dir / f"example_{i}.wav"
+                audio_file.export(utterance_path, format="wav")
+                new_latency = self.latency_provider.get_mean_latency()
+                new_jitter = self.latency_provider.get_std_latency()
+                self.topo.update_latency(new_latency, new_jitter)
+
+                client_process.stdin.write(f"{utterance_path}\n")
+                client_process.stdin.flush()
+                result = await asyncio.to_thread(self.read_client_result, client_process)
+                if result is None:
+                    logger.error("Client exited before finishing the utterance")
+                    break
+                results.append({"latency": new_latency, "jitter": new_jitter, **result})
+        finally:
+            client_process.stdin.close()
             while client_process.poll() is None:
                 await asyncio.sleep(0.1)
 
-            client_output, client_err = client_process.communicate()
-            if client_err:
-                logger.error(client_err)
+        return results
+
+    @staticmethod
+    def read_client_result(client_process) -> dict:
+        """
+        Read the client's output until it reports the result of an utterance.
+        """
+        for line in client_process.stdout:
+            if line.startswith("RESULT "):
+                return json.loads(line[len("RESULT "):])
+        return None
+
             
 class ManualLatencyProvider(LatencyProvider):
     def __init__(self, min_latency: float, max_latency: float, min_std_mult: float = 0.5, max_std_mult: float = 1.5):
@@ -125,6 +152,10 @@ class Main:
         max_len: int = None,
         output_dir: str = "output",
         input_dir: str = "input",
+        lazy: bool = False,
+        cache_dir: str = None,
+        seed: int = None,
+        noise_types: list = None,
     ):
         output_dir = Path(output_dir)
         input_dir = Path(input_dir)
@@ -135,7 +166,11 @@ class Main:
 
         latency_provider = ManualLatencyProvider(latency_mean[0], latency_mean[1], latency_std[0], latency_std[1])
         dataset = VoiceDataset(
-            root_dir=dataset_path, audio_processor=AudioProcessor(), max_len=max_len
+            root_dir=dataset_path,
+            audio_processor=AudioProcessor(seed=seed, noise_types=noise_types),
+            max_len=max_len,
+            lazy=lazy,
+            cache=ProcessedAudioCache(cache_dir) if cache_dir else None,
         )
 
         test_runner = TestRunner(
@@ -1,45 +1,121 @@
 import csv
+import multiprocessing
+import os
 from pathlib import Path
 import jiwer
 import fire
 
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 
 from loguru import logger
 import numpy as np
+import torch
 from tqdm import tqdm
 from network_sim.dataset import VoiceDataset
 from sklearn.metrics import accuracy_score
 
 from whisper.normalizers import EnglishTextNormalizer
 from auto_vtt.audio_processing import AudioProcessor
+from auto_vtt.audio_processing.cache import ProcessedAudioCache
 from auto_vtt.speech_to_text import SpeechToTextConverter
 
 
+def batched(iterable, n: int):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Converter owned by each worker process of a parallel evaluation
+_worker_stt = None
+
+
+def _init_worker(model_size: SpeechToTextConverter.ModelSize, num_threads: int):
+    global _worker_stt
+    torch.set_num_threads(num_threads)
+    _worker_stt = SpeechToTextConverter(model_size)
+
+
+def _transcribe_batch(audios: list, batch_size: int) -> list:
+    return _worker_stt.transcribe_batch(audios, batch_size)
+
+
 class ModelSizeTester:
     def __init__(
-        self, model_size: SpeechToTextConverter.ModelSize, dataset: VoiceDataset
+        self,
+        model_size: SpeechToTextConverter.ModelSize,
+        dataset: VoiceDataset,
+        num_workers: int = 1,
     ):
+        """
+        :param model_size: Whisper model size to evaluate.
+        :param dataset: Dataset of (audio, data) pairs to transcribe.
+        :param num_workers: Number of worker processes. Each loads its own model
+            and gets an equal share of the CPU threads.
+        """
         self.model_size = model_size
         self.dataset = dataset
-        self.stt = SpeechToTextConverter(model_size)
+        self.num_workers = num_workers
+        # workers load their own model, so only the serial path needs one here
+        self.stt = SpeechToTextConverter(model_size) if num_workers <= 1 else None
+
+    def transcribe_dataset(self, batch_size: int):
+        """
+        Yields (batch, transcribed texts) for the dataset in order, fanning the
+        batches out to the worker pool when `num_workers` > 1.
+        """
+        batches = batched(self.dataset, batch_size)
+        if self.num_workers <= 1:
+            for batch in batches:
+                yield batch, self.stt.transcribe_batch(
+                    [audio for audio, _ in batch], batch_size
+                )
+            return
+
+        num_threads = max(1, (os.cpu_count() or 1) // self.num_workers)
+        with ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.model_size, num_threads),
+        ) as pool:
+            # keep a couple of batches queued per worker so the dataset is not
+            # pulled into memory all at once
+            pending = deque()
+            for batch in batches:
+                future = pool.submit(
+                    _transcribe_batch, [audio for audio, _ in batch], batch_size
+                )
+                pending.append((batch, future))
+                if len(pending) >= 2 * self.num_workers:
+                    batch, future = pending.popleft()
+                    yield batch, future.result()
+
+            while pending:
+                batch, future = pending.popleft()
+                yield batch, future.result()
 
-    def evaluate_model_size(self):
+    def evaluate_model_size(self, batch_size: int = 16):
         results = []
         normalize = EnglishTextNormalizer()
-        i = 0
         transcript_file = open(f"transcripts_{self.model_size}.txt", "w")
         csv_writer = csv.writer(transcript_file)
         csv_writer.writerow(["transcription", "truth", "label"])
-        for audio, data in tqdm(self.dataset):
-            transcription = data["transcription"]
-            label = data["label"]
-            text = self.stt.transcribe(audio)
-            csv_writer.writerow([text, transcription, label])
-            i += 1
-            results.append(
-                jiwer.wer(normalize(transcription), normalize(text))
-            )
+        num_batches = -(-len(self.dataset) // batch_size)
+        for batch, texts in tqdm(self.transcribe_dataset(batch_size), total=num_batches):
+            for (_, data), text in zip(batch, texts):
+                transcription = data["transcription"]
+                label = data["label"]
+                csv_writer.writerow([text, transcription, label])
+                results.append(
+                    jiwer.wer(normalize(transcription), normalize(text))
+                )
             
         transcript_file.close()
 
@@ -47,11 +123,27 @@ class ModelSizeTester:
         return results
 
 
-def main(dataset_root: str, model_size: str, max_len: int):
+def main(
+    dataset_root: str,
+    model_size: str,
+    max_len: int,
+    batch_size: int = 16,
+    num_workers: int = 1,
+    lazy: bool = False,
+    cache_dir: str = None,
+    seed: int = None,
+    noise_types: list = None,
+):
     dataset_root = Path(dataset_root)
-    dataset = VoiceDataset(dataset_root, AudioProcessor(), max_len)
-    tester = ModelSizeTester(SpeechToTextConverter.ModelSize(model_size), dataset)
-    results = tester.evaluate_model_size()
+    cache = ProcessedAudioCache(cache_dir) if cache_dir else None
+    audio_processor = AudioProcessor(seed=seed, noise_types=noise_types)
+    dataset = VoiceDataset(
+        dataset_root, audio_processor, max_len, lazy=lazy, cache=cache
+    )
+    tester = ModelSizeTester(
+        SpeechToTextConverter.ModelSize(model_size), dataset, num_workers
+    )
+    results = tester.evaluate_model_size(batch_size)
     print(results)
     
 
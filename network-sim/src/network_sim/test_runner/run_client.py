@@ -1,4 +1,6 @@
+import asyncio
 import csv
+import json
 from pathlib import Path
 import sys
 import time
@@ -10,25 +12,79 @@ from auto_vtt.streaming.client import VariableRateStreamerClient
 logger.remove()
 logger.add(sys.stdout)
 
-async def main(server_ip: str, input_dir: str, log_suffix: str):
+CSV_HEADER = ["time_taken", "transcript", "intent", "server_time"]
+
+
+def result_row(time_taken: float, result: dict) -> list:
+    result = result or {}
+    return [
+        time_taken,
+        result.get("text"),
+        result.get("intent"),
+        result.get("timings", {}).get("total"),
+    ]
+
+
+async def main(server_ip: str, input_dir: str, log_suffix: str, chunked: bool = False, adaptive: bool = False, ladder: bool = False, interactive: bool = False):
     input_dir = Path(input_dir)
 
     client = VariableRateStreamerClient(
-        server_uri=f"ws://{server_ip}:8765"
+        server_uri=f"ws://{server_ip}:8765", ladder=ladder
     )
+    if interactive:
+        await serve_utterances(client, input_dir, log_suffix, adaptive)
+        return
+
     with open(input_dir / "example.wav", "rb") as f:
         data = f.read()
     async with client:
         start_time = time.time()
-        await client.stream_file(data)
+        if adaptive:
+            await client.stream_adaptive(input_dir / "example.wav")
+        elif chunked:
+            await client.stream_chunks(data)
+        else:
+            await client.stream_file(data)
         done_time = time.time()
     
     logger.info(f"Time taken: {done_time - start_time:.2f}s")
     
     with open(input_dir / f"transcript_{log_suffix}.txt", "w") as f:
         csv_writer = csv.writer(f)
-        csv_writer.writerow(["time_taken"])
-        csv_writer.writerow([done_time - start_time])
+        csv_writer.writerow(CSV_HEADER)
+        csv_writer.writerow(result_row(done_time - start_time, client.result))
+
+
+async def serve_utterances(client: VariableRateStreamerClient, input_dir: Path, log_suffix: str, adaptive: bool):
+    """
+    Send every WAV file named on stdin, one path per line, over a single
+    persistent connection. After each utterance a row is appended to the
+    transcript CSV and a `RESULT <json>` line is printed for the test runner.
+    """
+    with open(input_dir / f"transcript_{log_suffix}.txt", "w", newline="") as f:
+        csv_writer = csv.writer(f)
+        csv_writer.writerow(CSV_HEADER)
+        async with client:
+            while True:
+                line = await asyncio.to_thread(sys.stdin.readline)
+                if not line:
+                    break
+                path = line.strip()
+                if not path:
+                    continue
+
+                start_time = time.time()
+                result = await client.send_utterance(Path(path), adaptive=adaptive)
+                time_taken = time.time() - start_time
+                logger.info(f"Time taken: {time_taken:.2f}s")
+
+                csv_writer.writerow(result_row(time_taken, result))
+                f.flush()
+                print(
+                    "RESULT " + json.dumps({"path": path, "time_taken": time_taken, "result": result}),
+                    flush=True,
+                )
         
+
 if __name__ == "__main__":
     fire.Fire(main)
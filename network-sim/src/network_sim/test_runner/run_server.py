@@ -3,6 +3,9 @@ import fire
 
 from loguru import logger
 from auto_vtt.streaming.server import VariableRateStreamerServer
+from auto_vtt.streaming.executor import InferenceExecutor
+from auto_vtt.speech_to_text import SpeechToTextConverter
+from auto_vtt.inferencing.action_classifier import ActionClassifier
 
 logger.remove()
 logger.add(sys.stdout)
@@ -10,8 +13,36 @@ logger.add(sys.stdout)
 def on_done_processing():
     logger.info("Processing done.")
 
-async def main(output_dir: str):
-    server = VariableRateStreamerServer(output_dir, on_done_processing, port=8765)
+async def main(
+    output_dir: str,
+    model_size: str = None,
+    labels: list = None,
+    quantized: bool = False,
+    partial_interval: float = 1.0,
+    max_workers: int = 2,
+    max_sessions: int = None,
+    archive: bool = False,
+):
+    converter, classifier = None, None
+    if model_size is not None:
+        # load the model before accepting clients so the first one isn't slowed down
+        converter = SpeechToTextConverter(
+            SpeechToTextConverter.ModelSize(model_size), quantized=quantized
+        )
+        if labels:
+            classifier = ActionClassifier(labels)
+
+    server = VariableRateStreamerServer(
+        output_dir,
+        on_done_processing,
+        port=8765,
+        converter=converter,
+        classifier=classifier,
+        partial_interval=partial_interval,
+        executor=InferenceExecutor(max_workers) if converter is not None else None,
+        max_sessions=max_sessions,
+        archive=archive,
+    )
     await server.start()
 
 
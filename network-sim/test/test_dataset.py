@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from src.network_sim.dataset import VoiceDataset
+
+
+class CountingProcessor:
+    """
+    Stands in for `AudioProcessor`, producing one string per variant and
+    counting the files it processed.
+    """
+
+    noise_types = ["clean", "white", "babble"]
+
+    def __init__(self):
+        self.processed = []
+
+    def process_file(self, audio_path):
+        self.processed.append(audio_path.name)
+        return {noise: f"{audio_path.name}:{noise}" for noise in self.noise_types}
+
+
+@pytest.fixture
+def root_dir(tmp_path):
+    (tmp_path / "data").mkdir()
+    pd.DataFrame(
+        {
+            "path": [f"wavs/{i}.wav" for i in range(5)],
+            "action": ["activate", "none", "play", "deactivate", "play"],
+            "object": ["lights", "none", "music", "lamp", "news"],
+            "transcription": ["Turn on the lights", "Hm", "Play", "Lamp off", "News"],
+        }
+    ).to_csv(tmp_path / "data" / "train_data.csv")
+    return tmp_path
+
+
+def test_lazy_dataset_matches_eager(root_dir):
+    eager = VoiceDataset(root_dir, CountingProcessor())
+    lazy = VoiceDataset(root_dir, CountingProcessor(), lazy=True)
+
+    # the row without an action is dropped from both
+    assert len(lazy) == len(eager) == 4 * 3
+    assert [lazy[i] for i in range(len(lazy))] == eager.data
+    assert lazy[-1] == eager[len(eager) - 1] == ("4.wav:babble", lazy[3, "babble"][1])
+    with pytest.raises(IndexError):
+        lazy[len(lazy)]
+
+    for row_idx in range(4):
+        for type_idx, noise_type in enumerate(CountingProcessor.noise_types):
+            assert lazy[row_idx, noise_type] == eager[row_idx * 3 + type_idx]
+
+
+def test_lazy_dataset_processes_rows_on_access(root_dir):
+    processor = CountingProcessor()
+    dataset = VoiceDataset(root_dir, processor, lazy=True)
+    assert processor.processed == []
+
+    # the variants of a row are processed together, once
+    for idx in range(3, 6):
+        dataset[idx]
+    assert processor.processed == ["2.wav"]
+
+    dataset[11]
+    dataset[1, "white"]
+    assert processor.processed == ["2.wav", "4.wav", "2.wav"]
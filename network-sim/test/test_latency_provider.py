@@ -0,0 +1,63 @@
+import numpy as np
+
+from src.network_sim.latency_provider import LatencyProvider
+from src.network_sim.latency_provider.arma_latency_provider import (
+    Distribution,
+    LatencyModel,
+)
+
+
+def ar_trace(n: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    trace = np.zeros(n)
+    for t in range(2, n):
+        trace[t] = 0.6 * trace[t - 1] + 0.2 * trace[t - 2] + rng.normal()
+    return 50 + trace
+
+
+def make_model(spike_prob: float = 0.0) -> LatencyModel:
+    return LatencyModel(
+        ar_trace(1000),
+        lag=2,
+        dist_spike=Distribution(mean=100.0, std=10.0),
+        spike_prob=spike_prob,
+    )
+
+
+def test_generate_matches_scalar_recursion():
+    model = make_model()
+    assert isinstance(model, LatencyProvider)
+    # lag 1 first, and const is the process mean rather than an intercept
+    phi = model.fit.arparams
+    assert phi[0] > phi[1]
+    assert abs(model.mean - 50) < 1
+
+    history = list(model.prev_values)
+    np.random.seed(0)
+    generated = np.concatenate([model.generate_arima(7), model.generate_arima(5)])
+
+    np.random.seed(0)
+    noise = np.concatenate(
+        [
+            np.random.normal(scale=model.sigma, size=7),
+            np.random.normal(scale=model.sigma, size=5),
+        ]
+    )
+    expected = []
+    for e in noise:
+        value = model.mean + e
+        value += sum(p * (history[-1 - i] - model.mean) for i, p in enumerate(phi))
+        history.append(value)
+        expected.append(value)
+    assert np.allclose(generated, expected)
+
+
+def test_spikes_follow_their_distribution():
+    model = make_model(spike_prob=0.05)
+    np.random.seed(1)
+    spikes = model.generate_spikes(200_000)
+    assert abs(np.count_nonzero(spikes) / len(spikes) - 0.05) < 0.005
+    assert abs(spikes[spikes > 0].mean() - 100) < 1
+
+    latencies = list(model.iterator(1000, block_size=300))
+    assert len(latencies) == 1000